@@ -22,6 +22,7 @@ from git.tag import Tag
 from git.tree import Tree
 from git.utils import dashify
 from git.utils import touch
+from git.utils import LRUCache
 
 __all__ = [ name for name, obj in locals().items()
             if not (name.startswith('_') or inspect.ismodule(obj)) ]
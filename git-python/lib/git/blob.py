@@ -54,7 +54,7 @@ class Blob(object):
             The size will be cached after the first access
         """
         if self._size is None:
-            self._size = int(self.repo.git.cat_file(self.id, s=True).rstrip())
+            self._size = self.repo.git.get_object_header(self.id)[2]
         return self._size
 
     @property
@@ -68,7 +68,8 @@ class Blob(object):
         NOTE
             The data will be cached after the first access.
         """
-        self.data_stored = self.data_stored or self.repo.git.cat_file(self.id, p=True, with_raw_output=True)
+        if self.data_stored is None:
+            self.data_stored = self.repo.git.get_object_data(self.id)[3]
         return self.data_stored
 
     @property
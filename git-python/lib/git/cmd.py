@@ -5,8 +5,10 @@
 # the BSD License: http://www.opensource.org/licenses/bsd-license.php
 
 import os, sys
+import signal
 import subprocess
 import re
+from tempfile import TemporaryFile
 from utils import *
 from errors import GitCommandError
 
@@ -14,12 +16,56 @@ from errors import GitCommandError
 GIT_PYTHON_TRACE = os.environ.get("GIT_PYTHON_TRACE", False)
 
 execute_kwargs = ('input', 'istream', 'with_keep_cwd', 'with_extended_output',
-                  'with_exceptions', 'with_raw_output')
+                  'with_exceptions', 'with_raw_output', 'as_process')
 
 extra = {}
 if sys.platform == 'win32':
     extra = {'shell': True}
 
+class AutoInterrupt(object):
+    """
+    Wraps a git process started with ``as_process``, so its output can be
+    read incrementally from ``stdout``.
+
+    The process is terminated when the wrapper is dropped before git
+    finished, for example when a consumer stops reading early.
+
+    Its standard error goes to the temporary file ``stderr`` rather than a
+    pipe, so that git can't block on warnings nobody reads while its
+    output is being streamed.
+    """
+    def __init__(self, proc, command, stderr):
+        self.proc = proc
+        self.command = command
+        self.stderr = stderr
+
+    def __del__(self):
+        if self.proc.poll() is not None:
+            return
+
+        try:
+            self.proc.stdout.close()
+            os.kill(self.proc.pid, signal.SIGTERM)
+            self.proc.wait()
+        except (OSError, AttributeError):
+            pass
+
+    def __getattr__(self, attr):
+        return getattr(self.proc, attr)
+
+    def wait(self):
+        """
+        Wait for git to exit
+
+        Raise
+            GitCommandError if git returned a non-zero status
+        """
+        status = self.proc.wait()
+        if status != 0:
+            self.stderr.seek(0)
+            raise GitCommandError(self.command, status, self.stderr.read().rstrip())
+        return status
+
 class Git(object):
     """
     The Git class manages communication with the Git binary.
@@ -47,6 +93,10 @@ class Git(object):
         self.git_dir = git_dir
         self.extra = dict(extra)
 
+        # Long-lived 'git cat-file' processes, started on first use
+        self._cat_file_batch = None
+        self._cat_file_batch_check = None
+
     def __getattr__(self, name):
         """
         A convenience method as it allows to call the command as if it was 
@@ -73,6 +123,7 @@ class Git(object):
                 with_exceptions=True,
                 with_raw_output=False,
                 input=None,
+                as_process=False,
                 ):
         """
         Handles executing the command on the shell and consumes and returns
@@ -103,10 +154,15 @@ class Git(object):
         ``with_raw_output``
             Whether to avoid stripping off trailing whitespace.
 
+        ``as_process``
+            Whether to return the running process instead of its output, so
+            the output can be read incrementally.  ``input`` is ignored.
+
         Returns::
         
          str(output)                                  # extended_output = False (Default)
          tuple(int(status), str(stdout), str(stderr)) # extended_output = True
+         AutoInterrupt                                # as_process = True
         
         Raise
         	GitCommandError
@@ -124,15 +180,23 @@ class Git(object):
         else:
           cwd=self.git_dir
 
+        if as_process:
+            stderr = TemporaryFile()
+        else:
+            stderr = subprocess.PIPE
+
         # Start the process
         proc = subprocess.Popen(command,
                                 cwd=cwd,
                                 stdin=istream,
-                                stderr=subprocess.PIPE,
+                                stderr=stderr,
                                 stdout=subprocess.PIPE,
                                 **self.extra
                                 )
 
+        if as_process:
+            return AutoInterrupt(proc, command, stderr)
+
         # Wait for the process to return
         (stdout_value, stderr_value) = proc.communicate(input)
         status = proc.returncode
@@ -159,6 +223,98 @@ class Git(object):
         else:
             return stdout_value
 
+    def _persistent_cat_file(self, attr_name, batch_arg):
+        """
+        Return the long-lived 'git cat-file' process stored in ``attr_name``,
+        starting it with ``batch_arg`` if it isn't running yet.
+        """
+        proc = getattr(self, attr_name)
+        if proc is not None and proc.poll() is None:
+            return proc
+
+        command = ["git", "cat-file", batch_arg]
+        if GIT_PYTHON_TRACE:
+            print ' '.join(command)
+
+        if self.git_dir is None:
+            cwd = os.getcwd()
+        else:
+            cwd = self.git_dir
+
+        proc = subprocess.Popen(command,
+                                cwd=cwd,
+                                stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                **self.extra
+                                )
+        setattr(self, attr_name, proc)
+        return proc
+
+    def _read_object_header(self, proc, batch_arg, ref):
+        if '\n' in ref:
+            raise ValueError("Invalid object name %r" % ref)
+
+        proc.stdin.write("%s\n" % ref)
+        proc.stdin.flush()
+
+        header = proc.stdout.readline()
+        info = header.split()
+        if len(info) != 3:
+            raise GitCommandError(["git", "cat-file", batch_arg], 128,
+                                  "Object %s could not be resolved, git returned: %r" % (ref, header.strip()))
+
+        hexsha, typename, size = info
+        return (hexsha, typename, int(size))
+
+    def get_object_header(self, ref):
+        """
+        Look up the type and size of an object through a persistent
+        'git cat-file --batch-check' process, without forking git again.
+
+        ``ref``
+            is any object name understood by git-rev-parse
+
+        Raise
+            GitCommandError if the object does not exist
+
+        Returns
+            tuple(hexsha, typename, size)
+        """
+        proc = self._persistent_cat_file('_cat_file_batch_check', '--batch-check')
+        return self._read_object_header(proc, '--batch-check', ref)
+
+    def get_object_data(self, ref):
+        """
+        Read an object through a persistent 'git cat-file --batch' process,
+        without forking git again.
+
+        ``ref``
+            is any object name understood by git-rev-parse
+
+        Raise
+            GitCommandError if the object does not exist
+
+        Returns
+            tuple(hexsha, typename, size, data)
+        """
+        proc = self._persistent_cat_file('_cat_file_batch', '--batch')
+        hexsha, typename, size = self._read_object_header(proc, '--batch', ref)
+        data = proc.stdout.read(size)
+        proc.stdout.read(1) # Kill the trailing LF
+        return (hexsha, typename, size, data)
+
+    def clear_cache(self):
+        """
+        Stop the persistent 'git cat-file' processes.  They are restarted
+        on demand by the next object request.
+        """
+        for attr_name in ('_cat_file_batch', '_cat_file_batch_check'):
+            proc = getattr(self, attr_name)
+            if proc is not None:
+                proc.stdin.close()
+                proc.wait()
+            setattr(self, attr_name, None)
+
     def transform_kwargs(self, **kwargs):
         """
         Transforms Python style kwargs into git command line options.
@@ -6,10 +6,12 @@
 
 import re
 import time
+import weakref
 
 from actor import Actor
 from lazy import LazyMixin
 from tree import Tree
+from utils import full_sha
 import diff
 import stats
 
@@ -20,8 +22,12 @@ class Commit(LazyMixin):
     This class will act lazily on some of its attributes and will query the 
     value on demand only if it involves calling the git binary.
     """
+    lazy_properties = ['parents', 'tree', 'author', 'authored_date', 'committer',
+                       'committed_date', 'message', 'encoding']
+
     def __init__(self, repo, id, tree=None, author=None, authored_date=None,
-                 committer=None, committed_date=None, message=None, parents=None):
+                 committer=None, committed_date=None, message=None, parents=None,
+                 encoding=None):
         """
         Instantiate a new Commit. All keyword arguments taking None as default will 
         be implicitly set if id names a valid sha. 
@@ -52,6 +58,9 @@ class Commit(LazyMixin):
         ``message`` : string
             is the commit message
 
+        ``encoding`` : string
+            is the encoding of the commit message, if it isn't UTF-8
+
         Returns
             git.Commit
         """
@@ -59,33 +68,146 @@ class Commit(LazyMixin):
 
         self.repo = repo
         self.id = id
-        self.parents = None
-        self.tree = None
-        self.author = author
-        self.authored_date = authored_date
-        self.committer = committer
-        self.committed_date = committed_date
-        self.message = message
+        self._set_fields(tree, author, authored_date, committer, committed_date,
+                         message, parents, encoding)
+
+    def _set_fields(self, tree=None, author=None, authored_date=None,
+                    committer=None, committed_date=None, message=None,
+                    parents=None, encoding=None):
+        # Fields left unset are read through their LazyAttribute, which
+        # bakes the commit on first access.
+        if author is not None:
+            self.author = author
+        if authored_date is not None:
+            self.authored_date = authored_date
+        if committer is not None:
+            self.committer = committer
+        if committed_date is not None:
+            self.committed_date = committed_date
+        if message is not None:
+            self.message = message
+        if encoding is not None:
+            self.encoding = encoding
 
         if self.id:
             if parents is not None:
-                self.parents = [Commit(repo, p) for p in parents]
+                self.parents = [Commit.lookup(self.repo, p) for p in parents]
             if tree is not None:
-                self.tree = Tree(repo, id=tree)
+                self.tree = Tree(self.repo, id=tree)
 
     def __bake__(self):
         """
         Called by LazyMixin superclass when the first uninitialized member needs 
         to be set as it is queried.
         """
-        temp = Commit.find_all(self.repo, self.id, max_count=1)[0]
-        self.parents = temp.parents
-        self.tree = temp.tree
-        self.author = temp.author
-        self.authored_date = temp.authored_date
-        self.committer = temp.committer
-        self.committed_date = temp.committed_date
-        self.message = temp.message
+        group = self.__dict__.pop('_bake_group', None)
+        if group is not None:
+            Commit.bake_many(self.repo, [c for c in (ref() for ref in group) if c is not None])
+            if self.__baked__:
+                return
+
+        hexsha, typename, size, data = self.repo.git.get_object_data("%s^{commit}" % self.id)
+        self._set_fields(**self._parse_raw(data))
+
+    @classmethod
+    def bake_many(cls, repo, commits, chunk=1000):
+        """
+        Bake all unbaked commits of a list with one 'git cat-file --batch'
+        call per ``chunk`` commits, instead of one lookup per commit
+
+        ``repo``
+            is the Repo
+
+        ``commits``
+            is a list of git.Commit
+
+        ``chunk``
+            is the number of commits read by each git call, which bounds
+            the raw commit data held in memory at once
+
+        Returns
+            None
+        """
+        unbaked = [c for c in commits if not c.__baked__]
+        for start in xrange(0, len(unbaked), chunk):
+            cls._bake_chunk(repo, unbaked[start:start+chunk])
+
+    @classmethod
+    def _bake_chunk(cls, repo, unbaked):
+        input = "".join("%s^{commit}\n" % c.id for c in unbaked)
+        output = repo.git.cat_file(batch=True, input=input, with_raw_output=True)
+
+        pos = 0
+        for commit in unbaked:
+            end = output.index('\n', pos)
+            info = output[pos:end].split()
+            pos = end + 1
+            if len(info) != 3:
+                # Missing, left for the regular lazy lookup to report
+                continue
+
+            size = int(info[2])
+            data = output[pos:pos+size]
+            pos += size + 1
+
+            commit._set_fields(**cls._parse_raw(data))
+            commit.__dict__.pop('_bake_group', None)
+            commit.__bake_it__()
+
+    @staticmethod
+    def bake_together(commits, chunk=1000):
+        """
+        Mark commits which are likely to be used together, so that the
+        first of them to be baked bakes the ``chunk`` commits around it
+        with ``bake_many``
+
+        The commits only hold weak references to each other, so marking
+        them doesn't keep alive those dropped from the commit cache.
+
+        ``commits``
+            is a list of git.Commit
+
+        ``chunk``
+            is the number of commits baked together
+
+        Returns
+            ``commits``
+        """
+        unbaked = [c for c in commits if not c.__baked__]
+        for start in xrange(0, len(unbaked), chunk):
+            group = unbaked[start:start+chunk]
+            if len(group) > 1:
+                refs = [weakref.ref(c) for c in group]
+                for commit in group:
+                    commit._bake_group = refs
+        return commits
+
+    @classmethod
+    def lookup(cls, repo, id):
+        """
+        The Commit for the given SHA1, shared through the repository's
+        commit cache (see ``Repo.commit_cache``) if it has one, so every
+        user of a commit sees the same, once baked, object.
+
+        ``repo``
+            is the Repo
+
+        ``id``
+            is the SHA1 of the commit
+
+        Returns
+            git.Commit
+        """
+        cache = getattr(repo, 'commit_cache', None)
+        sha = full_sha(id)
+        if cache is None or sha is None:
+            return Commit(repo, id)
+
+        commit = cache.get(sha)
+        if commit is None:
+            commit = Commit(repo, sha)
+            cache[sha] = commit
+        return commit
 
     @property
     def id_abbrev(self):
@@ -151,43 +273,152 @@ class Commit(LazyMixin):
         return cls.list_from_string(repo, output)
 
     @classmethod
-    def list_from_string(cls, repo, text):
+    def iter_find_all(cls, repo, ref, path='', **kwargs):
         """
-        Parse out commit information into a list of Commit objects
+        Find all commits matching the given criteria, yielding each one
+        as soon as git printed it instead of buffering the whole history.
 
         ``repo``
             is the Repo
 
-        ``text``
-            is the text output from the git-rev-list command (raw format)
+        ``ref``
+            is the ref from which to begin (SHA1 or name)
+
+        ``path``
+            is an optinal path, if set only Commits that include the path
+            will be considered
+
+        ``kwargs``
+            optional keyword arguments to git, as for ``find_all``
+
+        Raises
+            GitCommandError once the output is exhausted, if git failed
 
         Returns
-            git.Commit[]
+            iterator of git.Commit
         """
-        lines = [l for l in text.splitlines() if l.strip()]
+        options = {'pretty': 'raw'}
+        options.update(kwargs)
 
-        commits = []
+        args = [ref, '--']
+        if path:
+            args.append(path)
 
-        while lines:
-            id = lines.pop(0).split()[1]
-            tree = lines.pop(0).split()[1]
+        proc = repo.git.rev_list(as_process=True, *args, **options)
+        for commit in cls.iter_from_stream(repo, proc.stdout):
+            yield commit
+        proc.wait()
 
-            parents = []
-            while lines and lines[0].startswith('parent'):
-                parents.append(lines.pop(0).split()[-1])
-            author, authored_date = cls.actor(lines.pop(0))
-            committer, committed_date = cls.actor(lines.pop(0))
+    @classmethod
+    def iter_from_stream(cls, repo, stream):
+        """
+        Parse commit information from a stream, yielding each Commit as
+        soon as it has been read
 
-            messages = []
-            while lines and lines[0].startswith('    '):
-                messages.append(lines.pop(0).strip())
+        ``repo``
+            is the Repo
 
-            message = '\n'.join(messages)
+        ``stream``
+            is an iterable of lines of git-rev-list output (raw format),
+            usually a pipe or file object
 
-            commits.append(Commit(repo, id=id, parents=parents, tree=tree, author=author, authored_date=authored_date,
-                                  committer=committer, committed_date=committed_date, message=message))
+        Returns
+            iterator of git.Commit
+        """
+        id = None
+        headers = messages = None
+        in_header = False
+        for line in stream:
+            line = line.rstrip('\n')
+            if line.startswith('commit '):
+                if id is not None:
+                    yield cls._from_parts(repo, id, headers, messages)
+                id = line.split()[1]
+                headers = []
+                messages = []
+                in_header = True
+            elif in_header:
+                if line:
+                    headers.append(line)
+                else:
+                    in_header = False
+            elif id is not None:
+                messages.append(line[4:])
+
+        if id is not None:
+            yield cls._from_parts(repo, id, headers, messages)
 
-        return commits
+    @classmethod
+    def list_from_string(cls, repo, text):
+        """
+        Parse out commit information into a list of Commit objects
+
+        ``repo``
+            is the Repo
+
+        ``text``
+            is the text output from the git-rev-list command (raw format)
+
+        Returns
+            git.Commit[]
+        """
+        return list(cls.iter_from_stream(repo, text.splitlines()))
+
+    @classmethod
+    def _from_parts(cls, repo, id, headers, messages):
+        fields = cls._parse_parts(headers, messages)
+
+        cache = getattr(repo, 'commit_cache', None)
+        sha = full_sha(id)
+        if cache is None or sha is None:
+            commit = Commit(repo, id, **fields)
+        else:
+            commit = cache.get(sha)
+            if commit is None:
+                commit = Commit(repo, sha, **fields)
+                cache[sha] = commit
+            elif not commit.__baked__:
+                commit._set_fields(**fields)
+
+        commit.__bake_it__()
+        return commit
+
+    @staticmethod
+    def _parse_raw(data):
+        # data is a commit object as read by 'git cat-file --batch'
+        header, _, body = data.partition('\n\n')
+        return Commit._parse_parts(header.splitlines(), body.split('\n'))
+
+    @staticmethod
+    def _parse_parts(headers, messages):
+        tree = None
+        parents = []
+        author = authored_date = committer = committed_date = encoding = None
+        for line in headers:
+            # Continuation lines of multi-line headers (gpgsig, mergetag)
+            # start with a space.
+            if line[:1] == ' ':
+                continue
+
+            key, _, value = line.partition(' ')
+            if key == 'tree':
+                tree = value
+            elif key == 'parent':
+                parents.append(value)
+            elif key == 'author':
+                author, authored_date = Commit._actor(value)
+            elif key == 'committer':
+                committer, committed_date = Commit._actor(value)
+            elif key == 'encoding':
+                encoding = value
+
+        while messages and not messages[-1].strip():
+            messages.pop()
+        message = '\n'.join(messages)
+
+        return dict(parents=parents, tree=tree, author=author, authored_date=authored_date,
+                    committer=committer, committed_date=committed_date, message=message,
+                    encoding=encoding)
 
     @classmethod
     def diff(cls, repo, a, b=None, paths=None):
@@ -284,6 +515,15 @@ class Commit(LazyMixin):
         Returns
             [Actor, gmtime(acted at time)]
         """
-        m = re.search(r'^.+? (.*) (\d+) .*$', line)
-        actor, epoch = m.groups()
-        return [Actor.from_string(actor), time.gmtime(int(epoch))]
+        return cls._actor(line.split(' ', 1)[1])
+
+    @staticmethod
+    def _actor(value):
+        # value is "Name <email> epoch tz"
+        actor, epoch, tz = value.rsplit(' ', 2)
+        start = actor.rfind(' <')
+        if start >= 0 and actor.endswith('>'):
+            actor = Actor(actor[:start], actor[start+2:-1])
+        else:
+            actor = Actor.from_string(actor)
+        return [actor, time.gmtime(int(epoch))]
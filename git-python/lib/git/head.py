@@ -82,6 +82,7 @@ class Head(object):
         for line in text.splitlines():
             heads.append(cls.from_string(repo, line))
 
+        commit.Commit.bake_together([h.commit for h in heads])
         return heads
 
     @classmethod
@@ -111,7 +112,7 @@ class Head(object):
         else:
             name = full_name
 
-        c = commit.Commit(repo, id=ids)
+        c = commit.Commit.lookup(repo, ids)
         return Head(name, c)
 
     def __repr__(self):
@@ -4,20 +4,43 @@
 # This module is part of GitPython and is released under
 # the BSD License: http://www.opensource.org/licenses/bsd-license.php
 
+class LazyAttribute(object):
+    """
+    Descriptor for an attribute filled in by ``__bake__``.
+
+    It is only consulted while the attribute is missing from the instance:
+    reading it bakes the object and returns the baked value (or None if
+    baking did not set it).  Once set, the instance attribute shadows the
+    descriptor and is read at normal attribute speed.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        instance.__prebake__()
+        return instance.__dict__.get(self.name)
+
+class LazyMeta(type):
+    """
+    Installs a LazyAttribute for every name listed in the class'
+    ``lazy_properties``.
+    """
+    def __init__(cls, name, bases, dct):
+        super(LazyMeta, cls).__init__(name, bases, dct)
+        for attr in dct.get('lazy_properties', ()):
+            setattr(cls, attr, LazyAttribute(attr))
+
 class LazyMixin(object):
+    __metaclass__ = LazyMeta
+
     lazy_properties = []
 
     def __init__(self):
         self.__baked__ = False
 
-    def __getattribute__(self, attr):
-        val = object.__getattribute__(self, attr)
-        if val is not None:
-            return val
-        else:
-            self.__prebake__()
-            return object.__getattribute__(self, attr)
-
     def __bake__(self):
         """ This method should be overridden in the derived class. """
         raise NotImplementedError(" '__bake__' method has not been implemented.")
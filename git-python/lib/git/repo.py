@@ -8,8 +8,8 @@ import os
 import re
 import gzip
 import StringIO
-from errors import InvalidGitRepositoryError, NoSuchPathError
-from utils import touch, is_git_dir
+from errors import InvalidGitRepositoryError, NoSuchPathError, GitCommandError
+from utils import touch, is_git_dir, full_sha, LRUCache
 from cmd import Git
 from head import Head
 from blob import Blob
@@ -25,13 +25,22 @@ class Repo(object):
     """
     DAEMON_EXPORT_FILE = 'git-daemon-export-ok'
 
-    def __init__(self, path=None):
+    def __init__(self, path=None, commit_cache_size=0, tree_cache_size=0):
         """
         Create a new Repo instance
 
         ``path``
             is the path to either the root git directory or the bare git repo
 
+        ``commit_cache_size``
+            is the number of commits to keep in ``commit_cache``.  If it is
+            0 (the default), commits are not shared.
+
+        ``tree_cache_size``
+            is the number of tree entries, over all trees, to keep parsed in
+            ``tree_cache``.  If it is 0 (the default), each Tree reads its
+            own contents.
+
         Examples::
 
             repo = Repo("/Users/mtrier/Development/git-python")
@@ -70,6 +79,20 @@ class Repo(object):
         if self.path is None:
            raise InvalidGitRepositoryError(epath)
 
+        self._rev_cache = {}
+
+        # Identity map of SHA1 -> Commit, see Commit.lookup
+        if commit_cache_size:
+            self.commit_cache = LRUCache(commit_cache_size)
+        else:
+            self.commit_cache = None
+
+        # SHA1 -> parsed entries of a tree, see Tree.__bake__
+        if tree_cache_size:
+            self.tree_cache = LRUCache(tree_cache_size, weigh=len)
+        else:
+            self.tree_cache = None
+
         self.git = Git(self.wd)
         if not self.bare:
             self.git.extra["env"] = {
@@ -140,6 +163,27 @@ class Repo(object):
 
         return Commit.find_all(self, start, path, **options)
 
+    def iter_commits(self, start='master', path='', **kwargs):
+        """
+        An iterator of Commit objects representing the history of a given
+        ref/commit, read from git incrementally
+
+        ``start``
+            is the branch/commit name (default 'master')
+
+        ``path``
+            is an optional path to limit the returned commits to
+            Commits that do not contain that path will not be returned.
+
+        ``kwargs``
+            keyword arguments specifying flags to be used in git-rev-list,
+            i.e.: max_count=10 to limit the amount of commits returned
+
+        Returns
+            iterator of ``git.Commit``
+        """
+        return Commit.iter_find_all(self, start, path, **kwargs)
+
     def commits_between(self, frm, to):
         """
         The Commits objects that are reachable via ``to`` but not via ``frm``
@@ -154,7 +198,7 @@ class Repo(object):
         Returns
             ``git.Commit[]``
         """
-        return reversed(Commit.find_all(self, "%s..%s" % (frm, to)))
+        return Commit.iter_find_all(self, "%s..%s" % (frm, to), reverse=True)
 
     def commits_since(self, start='master', path='', since='1970-01-01'):
         """
@@ -228,6 +272,149 @@ class Repo(object):
         diff_refs = list(set(other_repo_refs) - set(repo_refs))
         return map(lambda ref: Commit.find_all(other_repo, ref, max_count=1)[0], diff_refs)
 
+    def object_info(self, ids):
+        """
+        The type and size of many objects, looked up in a single
+        'git cat-file --batch-check' round trip
+
+        ``ids``
+            is a list of object names (SHA1s, refs or other revision
+            expressions)
+
+        Returns
+            list, with one item per given id in the same order: either
+            a tuple(hexsha, typename, size) or None if the object does
+            not exist
+        """
+        ids = list(ids)
+        if not ids:
+            return []
+
+        for id in ids:
+            if '\n' in id:
+                raise ValueError("Invalid object name %r" % id)
+
+        output = self.git.cat_file(batch_check=True, input="\n".join(ids) + "\n")
+
+        infos = []
+        for line in output.splitlines():
+            info = line.split()
+            if len(info) == 3 and info[2].isdigit():
+                infos.append((info[0], info[1], int(info[2])))
+            else:
+                infos.append(None)
+        return infos
+
+    def object_data(self, ids):
+        """
+        The contents of many objects, read in a single
+        'git cat-file --batch' round trip
+
+        ``ids``
+            is a list of object names (SHA1s, refs or other revision
+            expressions)
+
+        Returns
+            list, with one item per given id in the same order: either
+            a tuple(hexsha, typename, size, data) or None if the object
+            does not exist
+        """
+        ids = list(ids)
+        if not ids:
+            return []
+
+        for id in ids:
+            if '\n' in id:
+                raise ValueError("Invalid object name %r" % id)
+
+        output = self.git.cat_file(batch=True, input="\n".join(ids) + "\n",
+                                   with_raw_output=True)
+
+        objects = []
+        pos = 0
+        for id in ids:
+            end = output.index('\n', pos)
+            info = output[pos:end].split()
+            pos = end + 1
+            if len(info) != 3 or not info[2].isdigit():
+                objects.append(None)
+                continue
+
+            size = int(info[2])
+            objects.append((info[0], info[1], size, output[pos:pos+size]))
+            pos += size + 1
+        return objects
+
+    def rev_parse(self, rev):
+        """
+        The SHA1 of the object named by a revision expression
+
+        ``rev``
+            is a ref, SHA1 or any other expression understood by
+            git-rev-parse
+
+        Raises
+            GitCommandError if ``rev`` can't be resolved
+
+        Returns
+            str (the 40 character SHA1)
+        """
+        try:
+            return self._rev_cache[rev]
+        except KeyError:
+            pass
+
+        try:
+            sha = self.git.get_object_header(rev)[0]
+        except GitCommandError:
+            raise GitCommandError(['git', 'cat-file', '--batch-check'], 128,
+                                  "fatal: unknown revision: %s" % rev)
+
+        self._cache_rev(rev, sha)
+        return sha
+
+    def rev_parse_many(self, revs):
+        """
+        The SHA1s of the objects named by many revision expressions,
+        resolved with a single git process
+
+        ``revs``
+            is a list of refs, SHA1s or other expressions understood by
+            git-rev-parse
+
+        Raises
+            GitCommandError if any of ``revs`` can't be resolved
+
+        Returns
+            list of str (40 character SHA1s, in the order of ``revs``)
+        """
+        revs = list(revs)
+        resolved = {}
+        pending = []
+        for rev in revs:
+            if rev in resolved:
+                continue
+            elif rev in self._rev_cache:
+                resolved[rev] = self._rev_cache[rev]
+            else:
+                resolved[rev] = None
+                pending.append(rev)
+
+        for rev, info in zip(pending, self.object_info(pending)):
+            if info is None:
+                raise GitCommandError(['git', 'cat-file', '--batch-check'], 128,
+                                      "fatal: unknown revision: %s" % rev)
+            resolved[rev] = info[0]
+            self._cache_rev(rev, info[0])
+
+        return [resolved[rev] for rev in revs]
+
+    def _cache_rev(self, rev, sha):
+        # Only full SHA1s always resolve to the same object, refs move
+        self._rev_cache[sha] = sha
+        if full_sha(rev) is not None:
+            self._rev_cache[rev] = sha
+
     def tree(self, treeish='master'):
         """
         The Tree object for the given treeish reference
@@ -245,6 +432,26 @@ class Repo(object):
         """
         return Tree(self, id=treeish)
 
+    def object_at(self, treeish, path):
+        """
+        The object at a path of a tree, resolved with a single query to the
+        persistent 'git cat-file --batch-check' process
+
+        ``treeish``
+            is the reference of the tree (a commit, tag or tree)
+
+        ``path``
+            is the '/' separated path relative to the root of ``treeish``
+
+        Examples::
+
+          repo.object_at('master', 'lib/git/tree.py')
+
+        Returns
+            ``git.Blob`` or ``git.Tree`` or ``None`` if not found
+        """
+        return Tree(self, id=treeish).resolve(path)
+
     def blob(self, id):
         """
         The Blob object for the given id
@@ -276,6 +483,24 @@ class Repo(object):
         commits = self.git.log(*arg, **options)
         return Commit.list_from_string(self, commits)
 
+    def iter_log(self, commit='master', path=None, **kwargs):
+        """
+        Like ``log``, but yields each Commit as soon as git printed it
+        instead of buffering the whole history.
+
+        Returns
+            iterator of ``git.Commit``
+        """
+        options = {'pretty': 'raw'}
+        options.update(kwargs)
+        arg = [commit, '--']
+        if path:
+            arg.append(path)
+        proc = self.git.log(as_process=True, *arg, **options)
+        for c in Commit.iter_from_stream(self, proc.stdout):
+            yield c
+        proc.wait()
+
     def diff(self, a, b, *paths):
         """
         The diff from commit ``a`` to commit ``b``, optionally restricted to the given file(s)
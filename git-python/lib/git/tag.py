@@ -61,6 +61,7 @@ class Tag(object):
         tags = []
         for line in text.splitlines():
             tags.append(cls.from_string(repo, line))
+        Commit.bake_together([t.commit for t in tags])
         return tags
 
     @classmethod
@@ -85,7 +86,7 @@ class Tag(object):
         """
         full_name, ids = line.split("\x00")
         name = full_name.split("/")[-1]
-        commit = Commit(repo, id=ids)
+        commit = Commit.lookup(repo, ids)
         return Tag(name, commit)
 
     def __repr__(self):
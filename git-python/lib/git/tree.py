@@ -5,30 +5,98 @@
 # the BSD License: http://www.opensource.org/licenses/bsd-license.php
 
 import os
+from binascii import hexlify
 from lazy import LazyMixin
+from utils import full_sha
+from errors import GitCommandError
 import blob
 
 class Tree(LazyMixin):
+    lazy_properties = ['_contents']
+
     def __init__(self, repo, id, mode=None, name=None):
         LazyMixin.__init__(self)
         self.repo = repo
         self.id = id
         self.mode = mode
         self.name = name
-        self._contents = None
 
     def __bake__(self):
-        # Ensure the treeish references directly a tree
-        treeish = self.id
-        if not treeish.endswith(':'):
-            treeish = treeish + ':'
+        # Trees are immutable, so the entries parsed for a SHA1 are shared
+        # by all the Trees of the repository through its tree cache.  Each
+        # Tree builds its own objects from them, so the data read by a Blob
+        # goes away with its Tree instead of being held by the cache.
+        cache = getattr(self.repo, 'tree_cache', None)
+        entries = None
+        if cache is not None and full_sha(self.id) is not None:
+            entries = cache.get(full_sha(self.id))
+
+        if entries is None:
+            # Ensure the treeish references directly a tree
+            treeish = self.id
+            if ':' not in treeish:
+                treeish = treeish + '^{tree}'
+
+            # Read the tree contents through the repository's object reader.
+            id, typ, size, data = self.repo.git.get_object_data(treeish)
+            entries = tuple(self.entries_from_raw(data))
+            if cache is not None and id is not None:
+                cache[id] = entries
 
-        # Read the tree contents.
         self._contents = {}
-        for line in self.repo.git.ls_tree(self.id).splitlines():
-            obj = self.content_from_string(self.repo, line)
-            if obj is not None:
-                self._contents[obj.name] = obj
+        for entry in entries:
+            obj = self.from_entry(self.repo, entry)
+            self._contents[obj.name] = obj
+
+    @staticmethod
+    def entries_from_raw(data):
+        """
+        Parse the raw contents of a tree object
+
+        ``data``
+            is the tree object as returned by `git cat-file --batch`
+
+        Returns
+            list of (mode, type, id, name) tuples of the trees and blobs of
+            the tree (submodule commits are skipped)
+        """
+        entries = []
+        end = len(data)
+        pos = 0
+        while pos < end:
+            space = data.index(' ', pos)
+            nul = data.index('\0', space)
+            mode = data[pos:space].rjust(6, '0')
+            name = data[space+1:nul]
+            id = hexlify(data[nul+1:nul+21])
+            pos = nul + 21
+
+            if mode == "040000":
+                entries.append((mode, "tree", id, name))
+            elif mode == "160000":
+                continue
+            else:
+                entries.append((mode, "blob", id, name))
+        return entries
+
+    @staticmethod
+    def from_entry(repo, entry):
+        """
+        Create the object of a tree entry
+
+        ``repo``
+            is the Repo
+
+        ``entry``
+            is a (mode, type, id, name) tuple as returned by ``entries_from_raw``
+
+        Returns
+            ``git.Blob`` or ``git.Tree``
+        """
+        mode, typ, id, name = entry
+        if typ == "tree":
+            return Tree(repo, id=id, mode=mode, name=name)
+        return blob.Blob(repo, id=id, mode=mode, name=name)
 
     @staticmethod
     def content_from_string(repo, text):
@@ -58,6 +126,42 @@ class Tree(LazyMixin):
         else:
           raise(TypeError, "Invalid type: %s" % typ)
 
+    def resolve(self, path):
+        """
+        Find the object at a path below this tree with a single lookup of
+        '<treeish>:<path>' through the repository's object reader, without
+        reading the contents of any of the trees along the path
+
+        ``path``
+            is a '/' separated path relative to this tree
+
+        Returns
+            ``git.Blob`` or ``git.Tree`` or ``None`` if not found (or if the
+            path names a submodule commit).  The mode of the object is not
+            known without reading its parent tree and is left as None
+        """
+        parts = [part for part in path.split('/') if part]
+        if not parts:
+            return self
+
+        if ':' not in self.id:
+            ref = '%s:%s' % (self.id, '/'.join(parts))
+        elif self.id.endswith(':'):
+            ref = self.id + '/'.join(parts)
+        else:
+            ref = '%s/%s' % (self.id.rstrip('/'), '/'.join(parts))
+
+        try:
+            id, typ, size = self.repo.git.get_object_header(ref)
+        except GitCommandError:
+            return None
+
+        if typ == "tree":
+            return Tree(self.repo, id=id, name=parts[-1])
+        elif typ == "blob":
+            return blob.Blob(self.repo, id=id, name=parts[-1])
+        return None
+
     def __div__(self, file):
         """
         Find the named object in this tree's contents
@@ -83,7 +187,14 @@ class Tree(LazyMixin):
 
     # Implement the basics of the dict protocol:
     # directories/trees can be seen as object dicts.
+    # Keys with several '/' separated components are looked up directly
+    # (see ``resolve``) instead of through each intermediate tree.
     def __getitem__(self, key):
+        if '/' in key:
+            obj = self.resolve(key)
+            if obj is None:
+                raise KeyError(key)
+            return obj
         return self._contents[key]
 
     def __iter__(self):
@@ -93,9 +204,13 @@ class Tree(LazyMixin):
         return len(self._contents)
 
     def __contains__(self, key):
+        if '/' in key:
+            return self.resolve(key) is not None
         return key in self._contents
 
     def get(self, key):
+        if '/' in key:
+            return self.resolve(key)
         return self._contents.get(key)
 
     def items(self):
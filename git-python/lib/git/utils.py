@@ -5,6 +5,9 @@
 # the BSD License: http://www.opensource.org/licenses/bsd-license.php
 
 import os
+import re
+
+_sha_re = re.compile(r'^[0-9a-fA-F]{40}$')
 
 def dashify(string):
     return string.replace('_', '-')
@@ -25,3 +28,117 @@ def is_git_dir(d):
                 (os.path.islink(headref) and
                 os.readlink(headref).startswith('refs'))
     return False
+
+def full_sha(id):
+    """
+    The lowercase form of ``id`` if it is a full 40 character SHA1, so that
+    a SHA1 names a single cache entry whatever its case, else None
+    """
+    if id and _sha_re.match(id):
+        return id.lower()
+    return None
+
+class LRUCache(object):
+    """
+    A mapping holding at most ``maxsize`` items.  Once it is full, adding an
+    item evicts the least recently used one.
+
+    If a ``weigh`` callable is given, ``maxsize`` is instead the budget for
+    the total of ``weigh(value)`` over the items, and as many least
+    recently used items as needed are evicted to stay within it.  An item
+    heavier than the whole budget is not kept.
+
+    ``hits`` and ``misses`` count the outcome of ``get`` lookups.
+    """
+    PREV, NEXT, KEY, VALUE, WEIGHT = 0, 1, 2, 3, 4
+
+    def __init__(self, maxsize, weigh=None):
+        self.maxsize = maxsize
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._map = {}
+        # Circular doubly linked list of [prev, next, key, value, weight]
+        # links, most recently used first
+        self._root = root = []
+        root[:] = [root, root, None, None, 0]
+
+    def _unlink(self, link):
+        prev, next = link[self.PREV], link[self.NEXT]
+        prev[self.NEXT] = next
+        next[self.PREV] = prev
+
+    def _link_first(self, link):
+        root = self._root
+        first = root[self.NEXT]
+        link[self.PREV] = root
+        link[self.NEXT] = first
+        first[self.PREV] = link
+        root[self.NEXT] = link
+
+    def get(self, key, default=None):
+        link = self._map.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._unlink(link)
+        self._link_first(link)
+        return link[self.VALUE]
+
+    def __getitem__(self, key):
+        link = self._map[key]
+        self._unlink(link)
+        self._link_first(link)
+        return link[self.VALUE]
+
+    def __setitem__(self, key, value):
+        if self.weigh is None:
+            weight = 1
+        else:
+            weight = self.weigh(value)
+        if weight > self.maxsize:
+            if key in self._map:
+                del self[key]
+            return
+
+        link = self._map.get(key)
+        if link is not None:
+            self._unlink(link)
+            self.weight -= link[self.WEIGHT]
+            link[self.VALUE] = value
+            link[self.WEIGHT] = weight
+        else:
+            link = [None, None, key, value, weight]
+            self._map[key] = link
+
+        while self.weight + weight > self.maxsize:
+            last = self._root[self.PREV]
+            self._unlink(last)
+            del self._map[last[self.KEY]]
+            self.weight -= last[self.WEIGHT]
+
+        self.weight += weight
+        self._link_first(link)
+
+    def __delitem__(self, key):
+        link = self._map.pop(key)
+        self._unlink(link)
+        self.weight -= link[self.WEIGHT]
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def keys(self):
+        return self._map.keys()
+
+    def clear(self):
+        self._map.clear()
+        self.weight = 0
+        root = self._root
+        root[:] = [root, root, None, None, 0]
@@ -12,49 +12,49 @@ class TestBlob(object):
     def setup(self):
         self.repo = Repo(GIT_REPO)
     
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_should_return_blob_contents(self, git):
-        git.return_value = fixture('cat_file_blob')
+        git.return_value = ('abc', 'blob', 11, fixture('cat_file_blob'))
         blob = Blob(self.repo, **{'id': 'abc'})
         assert_equal("Hello world", blob.data)
         assert_true(git.called)
-        assert_equal(git.call_args, (('cat_file', 'abc'), {'p': True, 'with_raw_output': True}))
+        assert_equal(git.call_args, (('abc',), {}))
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_should_return_blob_contents_with_newline(self, git):
-        git.return_value = fixture('cat_file_blob_nl')
+        git.return_value = ('abc', 'blob', 12, fixture('cat_file_blob_nl'))
         blob = Blob(self.repo, **{'id': 'abc'})
         assert_equal("Hello world\n", blob.data)
         assert_true(git.called)
-        assert_equal(git.call_args, (('cat_file', 'abc'), {'p': True, 'with_raw_output': True}))
+        assert_equal(git.call_args, (('abc',), {}))
     
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_should_cache_data(self, git):
-        git.return_value = fixture('cat_file_blob')
+        git.return_value = ('abc', 'blob', 11, fixture('cat_file_blob'))
         blob = Blob(self.repo, **{'id': 'abc'})
         blob.data
         blob.data
         assert_true(git.called)
         assert_equal(git.call_count, 1)
-        assert_equal(git.call_args, (('cat_file', 'abc'), {'p': True, 'with_raw_output': True}))
+        assert_equal(git.call_args, (('abc',), {}))
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_header')
     def test_should_return_file_size(self, git):
-        git.return_value = fixture('cat_file_blob_size')
+        git.return_value = ('abc', 'blob', 11)
         blob = Blob(self.repo, **{'id': 'abc'})
         assert_equal(11, blob.size)
         assert_true(git.called)
-        assert_equal(git.call_args, (('cat_file', 'abc'), {'s': True}))
+        assert_equal(git.call_args, (('abc',), {}))
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_header')
     def test_should_cache_file_size(self, git):
-        git.return_value = fixture('cat_file_blob_size')
+        git.return_value = ('abc', 'blob', 11)
         blob = Blob(self.repo, **{'id': 'abc'})
         assert_equal(11, blob.size)
         assert_equal(11, blob.size)
         assert_true(git.called)
         assert_equal(git.call_count, 1)
-        assert_equal(git.call_args, (('cat_file', 'abc'), {'s': True}))
+        assert_equal(git.call_args, (('abc',), {}))
   
     def test_mime_type_should_return_mime_type_for_known_types(self):
         blob = Blob(self.repo, **{'id': 'abc', 'name': 'foo.png'})
@@ -4,6 +4,9 @@
 # This module is part of GitPython and is released under
 # the BSD License: http://www.opensource.org/licenses/bsd-license.php
 
+import time
+import weakref
+from StringIO import StringIO
 from test.testlib import *
 from git import *
 
@@ -11,18 +14,109 @@ class TestCommit(object):
     def setup(self):
         self.repo = Repo(GIT_REPO)
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_bake(self, git):
-        git.return_value = fixture('rev_list_single')
+        git.return_value = ('4c8124ffcf4039d292442eeccabdeca5af5c5017', 'commit', 229, fixture('cat_file_commit'))
 
         commit = Commit(self.repo, **{'id': '4c8124ffcf4039d292442eeccabdeca5af5c5017'})
         commit.author # bake
 
         assert_equal("Tom Preston-Werner", commit.author.name)
         assert_equal("tom@mojombo.com", commit.author.email)
+        assert_equal("672eca9b7f9e09c22dcb128c283e8c3c8d7697a4", commit.tree.id)
+        assert_equal(["634396b2f541a9f2d58b00be1a07f0c358b999b3"], [p.id for p in commit.parents])
+        assert_equal("implement Grit#heads", commit.message)
 
         assert_true(git.called)
-        assert_equal(git.call_args, (('rev_list', '4c8124ffcf4039d292442eeccabdeca5af5c5017', '--', ''), {'pretty': 'raw', 'max_count': 1}))
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args, (('4c8124ffcf4039d292442eeccabdeca5af5c5017^{commit}',), {}))
+
+    @patch_object(Git, 'get_object_data')
+    def test_bake_only_once_for_unset_fields(self, git):
+        git.return_value = ('4c8124ffcf4039d292442eeccabdeca5af5c5017', 'commit', 229, fixture('cat_file_commit'))
+
+        commit = Commit(self.repo, id='4c8124ffcf4039d292442eeccabdeca5af5c5017')
+        assert_none(commit.encoding)
+        assert_none(commit.encoding)
+        assert_equal("implement Grit#heads", commit.message)
+
+        assert_equal(git.call_count, 1)
+
+    def test_given_fields_do_not_bake(self):
+        commit = Commit(self.repo, id='abc', message="implement Grit#heads")
+        assert_equal("implement Grit#heads", commit.message)
+        assert_false(commit.__baked__)
+
+    @patch_object(Git, '_call_process')
+    def test_bake_many(self, git):
+        git.return_value = fixture('cat_file_batch_commits')
+
+        commits = [Commit(self.repo, id='4c8124ffcf4039d292442eeccabdeca5af5c5017'),
+                   Commit(self.repo, id='deadbeef'),
+                   Commit(self.repo, id='634396b2f541a9f2d58b00be1a07f0c358b999b3')]
+        Commit.bake_many(self.repo, commits)
+
+        assert_true(commits[0].__baked__)
+        assert_equal("implement Grit#heads", commits[0].message)
+        assert_false(commits[1].__baked__)
+        assert_true(commits[2].__baked__)
+        assert_equal([], commits[2].parents)
+        assert_equal("initial grit setup", commits[2].message)
+
+        assert_true(git.called)
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args, (('cat_file',), {'batch': True, 'with_raw_output': True,
+            'input': "4c8124ffcf4039d292442eeccabdeca5af5c5017^{commit}\ndeadbeef^{commit}\n634396b2f541a9f2d58b00be1a07f0c358b999b3^{commit}\n"}))
+
+    @patch_object(Git, '_call_process')
+    def test_bake_together(self, git):
+        git.return_value = fixture('cat_file_batch_commits')
+
+        commits = Commit.bake_together([Commit(self.repo, id='4c8124ffcf4039d292442eeccabdeca5af5c5017'),
+                                        Commit(self.repo, id='deadbeef'),
+                                        Commit(self.repo, id='634396b2f541a9f2d58b00be1a07f0c358b999b3')])
+
+        assert_equal("initial grit setup", commits[2].message)
+        assert_equal("implement Grit#heads", commits[0].message)
+
+        assert_equal(git.call_count, 1)
+
+    @patch_object(Git, '_call_process')
+    def test_bake_many_in_chunks(self, git):
+        git.return_value = fixture('cat_file_batch_commits')
+
+        commits = [Commit(self.repo, id='4c8124ffcf4039d292442eeccabdeca5af5c5017'),
+                   Commit(self.repo, id='deadbeef'),
+                   Commit(self.repo, id='634396b2f541a9f2d58b00be1a07f0c358b999b3')]
+        Commit.bake_many(self.repo, commits, chunk=2)
+
+        assert_equal(git.call_count, 2)
+        assert_equal(git.call_args_list[0][1]['input'],
+                     "4c8124ffcf4039d292442eeccabdeca5af5c5017^{commit}\ndeadbeef^{commit}\n")
+        assert_equal(git.call_args_list[1][1]['input'],
+                     "634396b2f541a9f2d58b00be1a07f0c358b999b3^{commit}\n")
+
+    @patch_object(Git, '_call_process')
+    def test_bake_together_in_chunks(self, git):
+        git.return_value = fixture('cat_file_batch_commits')
+
+        commits = Commit.bake_together([Commit(self.repo, id='4c8124ffcf4039d292442eeccabdeca5af5c5017'),
+                                        Commit(self.repo, id='deadbeef'),
+                                        Commit(self.repo, id='634396b2f541a9f2d58b00be1a07f0c358b999b3')],
+                                       chunk=2)
+
+        assert_equal("implement Grit#heads", commits[0].message)
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args[1]['input'],
+                     "4c8124ffcf4039d292442eeccabdeca5af5c5017^{commit}\ndeadbeef^{commit}\n")
+        assert_false(commits[2].__baked__)
+
+    def test_bake_together_does_not_keep_commits_alive(self):
+        commits = Commit.bake_together([Commit(self.repo, id='4c8124ffcf4039d292442eeccabdeca5af5c5017'),
+                                        Commit(self.repo, id='634396b2f541a9f2d58b00be1a07f0c358b999b3')])
+        dropped = weakref.ref(commits.pop())
+
+        assert_none(dropped())
 
     @patch_object(Git, '_call_process')
     def test_id_abbrev(self, git):
@@ -166,6 +260,7 @@ class TestCommit(object):
         git.return_value = fixture('show_empty_commit')
 
         commit = Commit(self.repo, id='634396b2f541a9f2d58b00be1a07f0c358b999b3')
+        commit.__bake_it__()
         diffs = commit.diffs
 
         assert_equal([], diffs)
@@ -229,6 +324,93 @@ class TestCommit(object):
         for sha1, commit in zip(expected_ids, commits):
             assert_equal(sha1, commit.id)
 
+    def test_list_from_string_with_gpgsig_and_encoding(self):
+        commits = Commit.list_from_string(self.repo, fixture('rev_list_gpgsig'))
+
+        assert_equal(2, len(commits))
+
+        c = commits[0]
+        assert_equal('2f0a9c3b5e8a7d4c1b0f9e8d7c6b5a4f3e2d1c0b', c.id)
+        assert_equal('9a8b7c6d5e4f3a2b1c0d9e8f7a6b5c4d3e2f1a0b', c.tree.id)
+        assert_equal(['4c8124ffcf4039d292442eeccabdeca5af5c5017',
+                      '634396b2f541a9f2d58b00be1a07f0c358b999b3'], [p.id for p in c.parents])
+        assert_equal('Tom Preston-Werner', c.committer.name)
+        assert_equal(time.gmtime(1191999972), c.committed_date)
+        assert_equal('ISO-8859-1', c.encoding)
+        assert_equal("Merge branch 'signed'\n\nThe merged branch contains\n    some indented text.", c.message)
+
+        c = commits[1]
+        assert_equal([], c.parents)
+        assert_equal(None, c.encoding)
+        assert_equal('initial grit setup', c.message)
+
+    def test_iter_from_stream(self):
+        stream = StringIO(fixture('rev_list'))
+
+        commits = Commit.iter_from_stream(self.repo, stream)
+
+        c = commits.next()
+        assert_equal('4c8124ffcf4039d292442eeccabdeca5af5c5017', c.id)
+        assert_equal("implement Grit#heads", c.message)
+        assert_true(stream.tell() < len(fixture('rev_list')))
+
+        assert_equal(['634396b2f541a9f2d58b00be1a07f0c358b999b3',
+                      'ab25fd8483882c3bda8a458ad2965d2248654335'],
+                     [c.id for c in commits])
+
+    @patch_object(Git, '_call_process')
+    def test_iter_find_all(self, git):
+        proc = Mock()
+        proc.stdout = StringIO(fixture('rev_list'))
+        git.return_value = proc
+
+        commits = list(Commit.iter_find_all(self.repo, 'master', max_count=3))
+
+        assert_equal(3, len(commits))
+        assert_equal('ab25fd8483882c3bda8a458ad2965d2248654335', commits[-1].id)
+
+        assert_true(git.called)
+        assert_true(proc.wait.called)
+        assert_equal(git.call_args, (('rev_list', 'master', '--'), {'pretty': 'raw', 'max_count': 3, 'as_process': True}))
+
+    def test_lookup_without_cache(self):
+        a = Commit.lookup(self.repo, '4c8124ffcf4039d292442eeccabdeca5af5c5017')
+        b = Commit.lookup(self.repo, '4c8124ffcf4039d292442eeccabdeca5af5c5017')
+        assert_false(a is b)
+
+    def test_lookup_shares_commits(self):
+        repo = Repo(GIT_REPO, commit_cache_size=10)
+
+        commits = Commit.list_from_string(repo, fixture('rev_list'))
+        assert_true(commits[1] is Commit.lookup(repo, '634396b2f541a9f2d58b00be1a07f0c358b999b3'))
+        assert_true(commits[0].parents[0] is commits[1])
+        assert_true(Commit.lookup(repo, 'master') is not Commit.lookup(repo, 'master'))
+
+    def test_lookup_ignores_case(self):
+        repo = Repo(GIT_REPO, commit_cache_size=10)
+
+        commit = Commit.lookup(repo, '4C8124FFCF4039D292442EECCABDECA5AF5C5017')
+        assert_true(commit is Commit.lookup(repo, '4c8124ffcf4039d292442eeccabdeca5af5c5017'))
+        assert_equal('4c8124ffcf4039d292442eeccabdeca5af5c5017', commit.id)
+        assert_equal(1, len(repo.commit_cache))
+
+    def test_lookup_is_bounded(self):
+        repo = Repo(GIT_REPO, commit_cache_size=2)
+
+        Commit.list_from_string(repo, fixture('rev_list'))
+
+        assert_equal(2, len(repo.commit_cache))
+
+    @patch_object(Git, 'get_object_data')
+    def test_lookup_bakes_shared_commit_once(self, git):
+        git.return_value = ('4c8124ffcf4039d292442eeccabdeca5af5c5017', 'commit', 229, fixture('cat_file_commit'))
+        repo = Repo(GIT_REPO, commit_cache_size=10)
+
+        Commit.lookup(repo, '4c8124ffcf4039d292442eeccabdeca5af5c5017').message
+        Commit.lookup(repo, '4c8124ffcf4039d292442eeccabdeca5af5c5017').message
+
+        assert_equal(git.call_count, 1)
+
     def test_str(self):
         commit = Commit(self.repo, id='abc')
         assert_equal ("abc", str(commit))
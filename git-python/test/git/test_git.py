@@ -51,6 +51,44 @@ class TestGit(object):
             output = self.git.execute(["cat", "/bin/bash"])
         assert_true(len(output) > 4096) # at least 4k
 
+    def test_it_reads_objects_through_a_persistent_process(self):
+        sha = self.git.hash_object(istream=open(fixture_path("cat_file_blob")), stdin=True)
+        try:
+            assert_equal((sha, 'blob', 11), self.git.get_object_header(sha))
+            assert_equal((sha, 'blob', 11, "Hello world"), self.git.get_object_data(sha))
+            proc = self.git._cat_file_batch
+            assert_equal((sha, 'blob', 11, "Hello world"), self.git.get_object_data(sha))
+            assert_true(proc is self.git._cat_file_batch)
+        finally:
+            self.git.clear_cache()
+        assert_none(self.git._cat_file_batch)
+
+    @raises(GitCommandError)
+    def test_it_raises_on_missing_objects(self):
+        try:
+            self.git.get_object_data('0' * 40)
+        finally:
+            self.git.clear_cache()
+
+    def test_it_returns_the_process(self):
+        proc = self.git.version(as_process=True)
+        assert_match('^git version [\d\.]{2}.*$', proc.stdout.read())
+        assert_equal(0, proc.wait())
+
+    @raises(GitCommandError)
+    def test_it_raises_errors_when_waiting_for_the_process(self):
+        proc = self.git.this_does_not_exist(as_process=True)
+        proc.stdout.read()
+        proc.wait()
+
+    def test_it_does_not_block_on_unread_errors(self):
+        # Far more than a pipe buffer of errors, none of it read before the
+        # output is exhausted
+        proc = self.git.execute(["sh", "-c", "yes warning | head -n 100000 >&2; echo done"],
+                                as_process=True)
+        assert_equal("done\n", proc.stdout.read())
+        assert_equal(0, proc.wait())
+
     @patch_object(Git, 'execute')
     def test_it_ignores_false_kwargs(self, git):
         # this_should_not_be_ignored=False implies it *should* be ignored
@@ -92,9 +92,9 @@ class TestRepo(object):
         assert_true(git.called)
         assert_equal(git.call_args, (('rev_list', '4c8124ffcf4039d292442eeccabdeca5af5c5017', '--', ''), {'pretty': 'raw', 'max_count': 1}))
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_tree(self, git):
-        git.return_value = fixture('ls_tree_a')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_a'))
 
         tree = self.repo.tree('master')
 
@@ -102,17 +102,101 @@ class TestRepo(object):
         assert_equal(3, len([c for c in tree.values() if isinstance(c, Tree)]))
 
         assert_true(git.called)
-        assert_equal(git.call_args, (('ls_tree', 'master'), {}))
+        assert_equal(git.call_args, (('master^{tree}',), {}))
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_header')
+    def test_object_at(self, git):
+        git.return_value = ('aa94e396335d2957ca92606f909e53e7beaf3fbb', 'blob', 11)
+
+        blob = self.repo.object_at('master', 'lib/grit.rb')
+        assert_equal(Blob, blob.__class__)
+        assert_equal('aa94e396335d2957ca92606f909e53e7beaf3fbb', blob.id)
+
+        assert_true(git.called)
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args, (('master:lib/grit.rb',), {}))
+
+    @patch_object(Git, 'get_object_data')
     def test_blob(self, git):
-        git.return_value = fixture('cat_file_blob')
+        git.return_value = ('abc', 'blob', 11, fixture('cat_file_blob'))
 
         blob = self.repo.blob("abc")
         assert_equal("Hello world", blob.data)
 
         assert_true(git.called)
-        assert_equal(git.call_args, (('cat_file', 'abc'), {'p': True, 'with_raw_output': True}))
+        assert_equal(git.call_args, (('abc',), {}))
+
+    @patch_object(Git, '_call_process')
+    def test_object_info(self, git):
+        git.return_value = fixture('cat_file_batch_check')
+
+        infos = self.repo.object_info(['master', 'deadbeef', '8b1e02c'])
+
+        assert_equal([('4c8124ffcf4039d292442eeccabdeca5af5c5017', 'commit', 229),
+                      None,
+                      ('8b1e02c0fb554eed2ce2ef737a68bb369d7527df', 'blob', 11)], infos)
+
+        assert_true(git.called)
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args, (('cat_file',), {'batch_check': True, 'input': "master\ndeadbeef\n8b1e02c\n"}))
+
+    @patch_object(Git, '_call_process')
+    def test_object_info_without_ids(self, git):
+        assert_equal([], self.repo.object_info([]))
+        assert_false(git.called)
+
+    @patch_object(Git, '_call_process')
+    def test_object_data(self, git):
+        git.return_value = "8b1e02c0fb554eed2ce2ef737a68bb369d7527df blob 11\nHello world\ndeadbeef missing\n8b1e02c0fb554eed2ce2ef737a68bb369d7527df blob 11\nHello world\n"
+
+        objects = self.repo.object_data(['8b1e02c', 'deadbeef', 'master:README'])
+
+        assert_equal([('8b1e02c0fb554eed2ce2ef737a68bb369d7527df', 'blob', 11, 'Hello world'),
+                      None,
+                      ('8b1e02c0fb554eed2ce2ef737a68bb369d7527df', 'blob', 11, 'Hello world')], objects)
+
+        assert_true(git.called)
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args, (('cat_file',), {'batch': True, 'input': "8b1e02c\ndeadbeef\nmaster:README\n", 'with_raw_output': True}))
+
+    @patch_object(Git, 'get_object_header')
+    def test_rev_parse(self, git):
+        git.return_value = ('4c8124ffcf4039d292442eeccabdeca5af5c5017', 'commit', 229)
+
+        assert_equal('4c8124ffcf4039d292442eeccabdeca5af5c5017', self.repo.rev_parse('master'))
+        assert_equal('4c8124ffcf4039d292442eeccabdeca5af5c5017', self.repo.rev_parse('4c8124ffcf4039d292442eeccabdeca5af5c5017'))
+
+        assert_true(git.called)
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args, (('master',), {}))
+
+    @patch_object(Git, 'get_object_header')
+    @raises(GitCommandError)
+    def test_rev_parse_with_invalid_rev(self, git):
+        git.side_effect = GitCommandError(['git', 'cat-file', '--batch-check'], 128)
+        self.repo.rev_parse('bogus')
+
+    @patch_object(Git, '_call_process')
+    def test_rev_parse_many(self, git):
+        git.return_value = "4c8124ffcf4039d292442eeccabdeca5af5c5017 commit 229\n8b1e02c0fb554eed2ce2ef737a68bb369d7527df blob 11"
+        self.repo._rev_cache['634396b2f541a9f2d58b00be1a07f0c358b999b3'] = '634396b2f541a9f2d58b00be1a07f0c358b999b3'
+
+        shas = self.repo.rev_parse_many(['master', '8b1e02c', 'master', '634396b2f541a9f2d58b00be1a07f0c358b999b3'])
+
+        assert_equal(['4c8124ffcf4039d292442eeccabdeca5af5c5017',
+                      '8b1e02c0fb554eed2ce2ef737a68bb369d7527df',
+                      '4c8124ffcf4039d292442eeccabdeca5af5c5017',
+                      '634396b2f541a9f2d58b00be1a07f0c358b999b3'], shas)
+
+        assert_true(git.called)
+        assert_equal(git.call_count, 1)
+        assert_equal(git.call_args, (('cat_file',), {'batch_check': True, 'input': "master\n8b1e02c\n"}))
+
+    @patch_object(Git, '_call_process')
+    @raises(GitCommandError)
+    def test_rev_parse_many_with_invalid_rev(self, git):
+        git.return_value = "deadbeef missing"
+        self.repo.rev_parse_many(['deadbeef'])
 
     @patch_object(Repo, '__init__')
     @patch_object(Git, '_call_process')
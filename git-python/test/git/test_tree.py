@@ -11,9 +11,9 @@ class TestTree(object):
     def setup(self):
         self.repo = Repo(GIT_REPO)
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_contents_should_cache(self, git):
-        git.return_value = fixture('ls_tree_a') + fixture('ls_tree_b')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_a') + fixture('cat_file_tree_b'))
     
         tree = self.repo.tree('master')
 
@@ -23,7 +23,7 @@ class TestTree(object):
         
         assert_true(git.called)
         assert_equal(2, git.call_count)
-        assert_equal(git.call_args, (('ls_tree', '34868e6e7384cb5ee51c543a8187fdff2675b5a7'), {}))
+        assert_equal(git.call_args, (('34868e6e7384cb5ee51c543a8187fdff2675b5a7^{tree}',), {}))
   
     def test_content_from_string_tree_should_return_tree(self):
         text = fixture('ls_tree_a').splitlines()[-1]
@@ -55,9 +55,9 @@ class TestTree(object):
         Tree.content_from_string(None, "040000 bogus 650fa3f0c17f1edb4ae53d8dcca4ac59d86e6c44	test")
 
     @patch_object(Blob, 'size')
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_slash(self, git, blob):
-        git.return_value = fixture('ls_tree_a')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_a'))
         blob.return_value = 1
         
         tree = self.repo.tree('master')
@@ -66,12 +66,12 @@ class TestTree(object):
         assert_equal('8b1e02c0fb554eed2ce2ef737a68bb369d7527df', (tree/'README.txt').id)
         
         assert_true(git.called)
-        assert_equal(git.call_args, (('ls_tree', 'master'), {}))
+        assert_equal(git.call_args, (('master^{tree}',), {}))
   
     @patch_object(Blob, 'size')
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_slash_with_zero_length_file(self, git, blob):
-        git.return_value = fixture('ls_tree_a')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_a'))
         blob.return_value = 0
         
         tree = self.repo.tree('master')
@@ -80,11 +80,11 @@ class TestTree(object):
         assert_equal('8b1e02c0fb554eed2ce2ef737a68bb369d7527df', (tree/'README.txt').id)
         
         assert_true(git.called)
-        assert_equal(git.call_args, (('ls_tree', 'master'), {}))
+        assert_equal(git.call_args, (('master^{tree}',), {}))
   
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_slash_with_commits(self, git):
-        git.return_value = fixture('ls_tree_commit')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_commit'))
 
         tree = self.repo.tree('master')
     
@@ -93,12 +93,12 @@ class TestTree(object):
         assert_equal('f623ee576a09ca491c4a27e48c0dfe04be5f4a2e', (tree/'baz').id)
 
         assert_true(git.called)
-        assert_equal(git.call_args, (('ls_tree', 'master'), {}))
+        assert_equal(git.call_args, (('master^{tree}',), {}))
 
     @patch_object(Blob, 'size')
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_dict(self, git, blob):
-        git.return_value = fixture('ls_tree_a')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_a'))
         blob.return_value = 1
 
         tree = self.repo.tree('master')
@@ -107,12 +107,12 @@ class TestTree(object):
         assert_equal('8b1e02c0fb554eed2ce2ef737a68bb369d7527df', tree['README.txt'].id)
 
         assert_true(git.called)
-        assert_equal(git.call_args, (('ls_tree', 'master'), {}))
+        assert_equal(git.call_args, (('master^{tree}',), {}))
 
     @patch_object(Blob, 'size')
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_dict_with_zero_length_file(self, git, blob):
-        git.return_value = fixture('ls_tree_a')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_a'))
         blob.return_value = 0
 
         tree = self.repo.tree('master')
@@ -121,11 +121,11 @@ class TestTree(object):
         assert_equal('8b1e02c0fb554eed2ce2ef737a68bb369d7527df', tree['README.txt'].id)
 
         assert_true(git.called)
-        assert_equal(git.call_args, (('ls_tree', 'master'), {}))
+        assert_equal(git.call_args, (('master^{tree}',), {}))
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     def test_dict_with_commits(self, git):
-        git.return_value = fixture('ls_tree_commit')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_commit'))
 
         tree = self.repo.tree('master')
 
@@ -134,16 +134,124 @@ class TestTree(object):
         assert_equal('f623ee576a09ca491c4a27e48c0dfe04be5f4a2e', tree['baz'].id)
 
         assert_true(git.called)
-        assert_equal(git.call_args, (('ls_tree', 'master'), {}))
+        assert_equal(git.call_args, (('master^{tree}',), {}))
 
-    @patch_object(Git, '_call_process')
+    @patch_object(Git, 'get_object_data')
     @raises(KeyError)
     def test_dict_with_non_existant_file(self, git):
-        git.return_value = fixture('ls_tree_commit')
+        git.return_value = (None, 'tree', None, fixture('cat_file_tree_commit'))
 
         tree = self.repo.tree('master')
         tree['bar']
 
+    @patch_object(Git, 'get_object_data')
+    @patch_object(Git, 'get_object_header')
+    def test_dict_with_path(self, header, data):
+        header.return_value = ('aa94e396335d2957ca92606f909e53e7beaf3fbb', 'blob', 11)
+
+        tree = self.repo.tree('master')
+        blob = tree['lib/grit.rb']
+
+        assert_equal(Blob, blob.__class__)
+        assert_equal('aa94e396335d2957ca92606f909e53e7beaf3fbb', blob.id)
+        assert_equal('grit.rb', blob.name)
+
+        assert_equal(header.call_args, (('master:lib/grit.rb',), {}))
+        assert_false(data.called)
+
+    @patch_object(Git, 'get_object_data')
+    @patch_object(Git, 'get_object_header')
+    def test_contains_with_path(self, header, data):
+        header.return_value = ('aa94e396335d2957ca92606f909e53e7beaf3fbb', 'blob', 11)
+
+        tree = self.repo.tree('master')
+
+        assert_true('lib/grit.rb' in tree)
+        assert_equal(header.call_args, (('master:lib/grit.rb',), {}))
+        assert_false(data.called)
+
+        header.side_effect = GitCommandError(['git', 'cat-file', '--batch-check'], 128)
+        assert_false('lib/bogus' in tree)
+
+    @patch_object(Git, 'get_object_header')
+    def test_get_with_path(self, git):
+        git.return_value = ('650fa3f0c17f1edb4ae53d8dcca4ac59d86e6c44', 'tree', 132)
+
+        tree = Tree(self.repo, id='master:lib')
+        subtree = tree.get('grit/test/')
+
+        assert_equal(Tree, subtree.__class__)
+        assert_equal('650fa3f0c17f1edb4ae53d8dcca4ac59d86e6c44', subtree.id)
+        assert_equal('test', subtree.name)
+        assert_equal(git.call_args, (('master:lib/grit/test',), {}))
+
+    @patch_object(Git, 'get_object_header')
+    def test_slash_with_path_to_commit(self, git):
+        git.return_value = ('2afb47bcedf21663580d5e6d2f406f08f3f65f19', 'commit', 229)
+
+        tree = self.repo.tree('master')
+        assert_none(tree/'vendor/module')
+
+    @patch_object(Git, 'get_object_header')
+    @raises(KeyError)
+    def test_dict_with_non_existant_path(self, git):
+        git.side_effect = GitCommandError(['git', 'cat-file', '--batch-check'], 128)
+
+        tree = self.repo.tree('master')
+        tree['lib/bogus']
+
+    @patch_object(Git, 'get_object_data')
+    def test_contents_should_be_shared_through_tree_cache(self, git):
+        git.return_value = ('34868e6e7384cb5ee51c543a8187fdff2675b5a7', 'tree', None, fixture('cat_file_tree_a'))
+
+        repo = Repo(GIT_REPO, tree_cache_size=100)
+        tree = repo.tree('34868e6e7384cb5ee51c543a8187fdff2675b5a7')
+        other = repo.tree('34868e6e7384cb5ee51c543a8187fdff2675b5a7')
+
+        assert_equal(tree.keys(), other.keys())
+        assert_equal(1, git.call_count)
+        assert_equal(1, repo.tree_cache.hits)
+        assert_equal(1, repo.tree_cache.misses)
+        assert_equal(len(tree), repo.tree_cache.weight)
+
+    @patch_object(Git, 'get_object_data')
+    def test_tree_cache_should_not_share_objects(self, git):
+        git.return_value = ('34868e6e7384cb5ee51c543a8187fdff2675b5a7', 'tree', None, fixture('cat_file_tree_a'))
+
+        repo = Repo(GIT_REPO, tree_cache_size=100)
+        tree = repo.tree('34868e6e7384cb5ee51c543a8187fdff2675b5a7')
+        other = repo.tree('34868e6e7384cb5ee51c543a8187fdff2675b5a7')
+
+        for name in tree.keys():
+            assert_equal(tree[name].id, other[name].id)
+            assert_equal(tree[name].mode, other[name].mode)
+            assert_false(tree[name] is other[name])
+        assert_equal(1, git.call_count)
+        for entry in repo.tree_cache.get('34868e6e7384cb5ee51c543a8187fdff2675b5a7'):
+            assert_equal(tuple, type(entry))
+
+    @patch_object(Git, 'get_object_data')
+    def test_tree_cache_should_be_keyed_by_sha(self, git):
+        git.return_value = ('34868e6e7384cb5ee51c543a8187fdff2675b5a7', 'tree', None, fixture('cat_file_tree_a'))
+
+        repo = Repo(GIT_REPO, tree_cache_size=100)
+        repo.tree('master').keys()
+        repo.tree('34868e6e7384cb5ee51c543a8187fdff2675b5a7').keys()
+
+        assert_equal(1, git.call_count)
+        assert_true('34868e6e7384cb5ee51c543a8187fdff2675b5a7' in repo.tree_cache)
+
+    @patch_object(Git, 'get_object_data')
+    def test_tree_cache_should_evict_within_budget(self, git):
+        git.return_value = ('34868e6e7384cb5ee51c543a8187fdff2675b5a7', 'tree', None, fixture('cat_file_tree_a'))
+
+        repo = Repo(GIT_REPO, tree_cache_size=1)
+        repo.tree('34868e6e7384cb5ee51c543a8187fdff2675b5a7').keys()
+        repo.tree('34868e6e7384cb5ee51c543a8187fdff2675b5a7').keys()
+
+        assert_equal(2, git.call_count)
+        assert_equal(0, len(repo.tree_cache))
+
     def test_repr(self):
         tree = Tree(self.repo, id='abc')
         assert_equal('<git.Tree "abc">', repr(tree))
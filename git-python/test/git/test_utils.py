@@ -19,3 +19,60 @@ class TestUtils(object):
     def test_it_should_dashify(self):
         assert_equal('this-is-my-argument', dashify('this_is_my_argument'))
         assert_equal('foo', dashify('foo'))
+
+    def test_lru_cache_should_evict_least_recently_used(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        assert_equal(1, cache.get('a'))
+        cache['c'] = 3
+
+        assert_equal(2, len(cache))
+        assert_true('a' in cache)
+        assert_false('b' in cache)
+        assert_true('c' in cache)
+
+    def test_lru_cache_should_count_hits_and_misses(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+
+        assert_equal(2, cache.hits)
+        assert_equal(1, cache.misses)
+
+    def test_lru_cache_of_size_zero_should_stay_empty(self):
+        cache = LRUCache(0)
+        cache['a'] = 1
+        assert_equal(0, len(cache))
+
+    def test_weighted_lru_cache_should_evict_to_stay_within_budget(self):
+        cache = LRUCache(5, weigh=len)
+        cache['a'] = 'xx'
+        cache['b'] = 'xx'
+        cache.get('a')
+        cache['c'] = 'xxx'
+
+        assert_equal(5, cache.weight)
+        assert_true('a' in cache)
+        assert_false('b' in cache)
+        assert_true('c' in cache)
+
+    def test_weighted_lru_cache_should_reweigh_replaced_items(self):
+        cache = LRUCache(5, weigh=len)
+        cache['a'] = 'x'
+        cache['a'] = 'xxxx'
+        assert_equal(4, cache.weight)
+
+        del cache['a']
+        assert_equal(0, cache.weight)
+
+    def test_weighted_lru_cache_should_not_keep_items_over_budget(self):
+        cache = LRUCache(5, weigh=len)
+        cache['a'] = 'xx'
+        cache['b'] = 'xxxxxx'
+
+        assert_true('a' in cache)
+        assert_false('b' in cache)
+        assert_equal(2, cache.weight)
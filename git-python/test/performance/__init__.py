@@ -0,0 +1,15 @@
+# __init__.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+
+# The benchmarks take a while and compare timings, which are unreliable on
+# a loaded machine, so they only run when asked for.
+
+import os
+from nose.plugins.skip import SkipTest
+
+def setup():
+    if not os.environ.get('GIT_PYTHON_TEST_PERFORMANCE'):
+        raise SkipTest("set GIT_PYTHON_TEST_PERFORMANCE to run the performance tests")
@@ -0,0 +1,44 @@
+# test_commit.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+
+import sys
+from time import time
+from test.testlib import *
+from git import *
+
+def rev_list_output(ncommits):
+    """
+    rev-list output with ``ncommits`` commits, made by repeating the
+    commits of the rev_list* fixtures
+    """
+    chunks = []
+    for name in ('rev_list', 'rev_list_single', 'rev_list_bisect_all',
+                 'rev_list_commit_diffs', 'rev_list_commit_stats'):
+        chunks.extend('commit ' + c for c in fixture(name).split('\ncommit ') if c.strip())
+    chunks = [c.replace('commit commit ', 'commit ').rstrip('\n') + '\n\n' for c in chunks]
+
+    return ''.join(chunks[i % len(chunks)] for i in xrange(ncommits))
+
+class TestCommitPerformance(object):
+    def setup(self):
+        self.repo = Repo(GIT_REPO)
+
+    def _parse(self, ncommits):
+        text = rev_list_output(ncommits)
+        start = time()
+        commits = Commit.list_from_string(self.repo, text)
+        elapsed = time() - start
+        assert_equal(ncommits, len(commits))
+        return elapsed
+
+    def test_list_from_string(self):
+        small = self._parse(10000)
+        large = self._parse(100000)
+        print >> sys.stderr, "Parsed 100000 commits in %f s (%f commits / s)" % (large, 100000 / large)
+
+        # Parsing is linear: ten times as many commits must not take
+        # anywhere near a hundred times as long.
+        assert_true(large < small * 30, "%f s for 10000 commits, %f s for 100000" % (small, large))
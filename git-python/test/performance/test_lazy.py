@@ -0,0 +1,56 @@
+# test_lazy.py
+# Copyright (C) 2008, 2009 Michael Trier (mtrier@gmail.com) and contributors
+#
+# This module is part of GitPython and is released under
+# the BSD License: http://www.opensource.org/licenses/bsd-license.php
+
+import sys
+from time import time
+from test.testlib import *
+from git import *
+
+class GetattributeLazyMixin(object):
+    """The previous LazyMixin, which checked every attribute read for None."""
+    def __init__(self):
+        self.__baked__ = False
+
+    def __getattribute__(self, attr):
+        val = object.__getattribute__(self, attr)
+        if val is not None:
+            return val
+        else:
+            self.__prebake__()
+            return object.__getattribute__(self, attr)
+
+    def __prebake__(self):
+        if self.__baked__:
+            return
+        self.__baked__ = True
+
+class GetattributeCommit(GetattributeLazyMixin):
+    def __init__(self, repo, id, message):
+        GetattributeLazyMixin.__init__(self)
+        self.repo = repo
+        self.id = id
+        self.message = message
+
+class TestLazyPerformance(object):
+    def setup(self):
+        self.repo = Repo(GIT_REPO)
+
+    def _access(self, commit, count):
+        start = time()
+        for i in xrange(count):
+            commit.id
+            commit.repo
+            commit.message
+        return time() - start
+
+    def test_attribute_access(self):
+        count = 300000
+        sha = '4c8124ffcf4039d292442eeccabdeca5af5c5017'
+        before = self._access(GetattributeCommit(self.repo, sha, "message"), count)
+        after = self._access(Commit(self.repo, sha, message="message"), count)
+        print >> sys.stderr, "%d attribute reads: %f s with __getattribute__, %f s with descriptors" % (count * 3, before, after)
+
+        assert_true(after < before, "descriptors (%f s) slower than __getattribute__ (%f s)" % (after, before))
@@ -28,6 +28,8 @@ setup(name = "git-origin",
               "git-origin = git_origin.cmd:origin",
               "git-origin-blacklist = git_origin.cmd:blacklist",
               "git-cherry-origins = git_origin.cmd:cherry",
+              "git-populate-origins = git_origin.cmd:populate",
+              "git-suggest-origins = git_origin.cmd:suggest",
               "git-file-origin = git_origin.cmd:file",
               "git-pull-origins = git_origin.cmd:pull",
               "git-push-origins = git_origin.cmd:push",
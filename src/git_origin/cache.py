@@ -0,0 +1,199 @@
+"""On-disk cache of the origins notes, keyed by the notes commit.
+
+The file is written once per notes tip and memory-mapped when read, so
+looking up a few commits doesn't require parsing the whole file.  Layout
+(all integers big endian):
+
+    header      magic "GORC", version, notes tip (20 bytes), number of
+                commit/origin pairs, number of blacklisted commits, size
+                of the extra notes
+    forward     (commit, origin) pairs of 20 byte SHA1s, sorted by commit
+    reverse     (origin, commit) pairs of 20 byte SHA1s, sorted by origin
+    blacklist   20 byte SHA1s
+    extra       text lines for what the tables can't hold: "COMMIT ORIGIN"
+                for an origin which isn't a full SHA1, "COMMIT" for a note
+                without any full SHA1, and "- ID" for a blacklist entry
+                which isn't a full SHA1
+
+The notes are kept as written, whether or not the commits they name
+exist, so that the cache doesn't depend on the objects of the repository
+at the time it was written.
+
+The file is replaced atomically, so a crash leaves either the old or the
+new cache behind, never a partial one.
+"""
+
+import os
+import re
+import mmap
+import struct
+from binascii import hexlify, unhexlify
+from tempfile import mkstemp
+from os.path import dirname, basename
+
+
+magic = "GORC"
+version = 2
+_header = struct.Struct(">4sI20sIII")
+_sha_re = re.compile(r"^[0-9a-f]{40}$")
+_pair_size = 40
+_id_size = 20
+
+
+class PairTable(object):
+    """Read-only mapping of SHA1 to a list of SHA1s over a sorted run of
+    (key, value) records of a buffer."""
+
+    def __init__(self, buf, offset, count):
+        self.buf = buf
+        self.offset = offset
+        self.count = count
+        self._keys = None
+
+    def _key(self, i):
+        pos = self.offset + i * _pair_size
+        return self.buf[pos:pos + _id_size]
+
+    def _value(self, i):
+        pos = self.offset + i * _pair_size + _id_size
+        return self.buf[pos:pos + _id_size]
+
+    def _lower_bound(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, id, default=None):
+        if len(id) != 40:
+            return default
+        try:
+            key = unhexlify(id)
+        except TypeError:
+            return default
+
+        i = self._lower_bound(key)
+        values = []
+        while i < self.count and self._key(i) == key:
+            values.append(hexlify(self._value(i)))
+            i += 1
+        return values or default
+
+    def __getitem__(self, id):
+        values = self.get(id)
+        if values is None:
+            raise KeyError(id)
+        return values
+
+    def __contains__(self, id):
+        return self.get(id) is not None
+
+    def iteritems(self):
+        key, values = None, None
+        for i in xrange(self.count):
+            k = self._key(i)
+            if k != key:
+                if key is not None:
+                    yield hexlify(key), values
+                key, values = k, []
+            values.append(hexlify(self._value(i)))
+        if key is not None:
+            yield hexlify(key), values
+
+    def __iter__(self):
+        return (key for (key, values) in self.iteritems())
+
+    def __len__(self):
+        if self._keys is None:
+            self._keys = sum(1 for key in self)
+        return self._keys
+
+
+def read(path):
+    """Map the cache file at ``path``.
+
+    Returns a tuple of (tip, forward PairTable, reverse PairTable,
+    blacklist, extra), or None if there is no usable cache.  ``extra``
+    maps the commits of the notes which the pair tables don't hold in
+    full to the origins missing from them, possibly none."""
+    try:
+        f = open(path, "rb")
+    except IOError:
+        return
+
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size < _header.size:
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+    (fmagic, fversion, tip, pairs, blacklisted, extrasize) = _header.unpack(buf[:_header.size])
+    if fmagic != magic or fversion != version or \
+       size != _header.size + 2 * pairs * _pair_size + blacklisted * _id_size + extrasize:
+        return
+
+    offset = _header.size
+    forward = PairTable(buf, offset, pairs)
+    offset += pairs * _pair_size
+    reverse = PairTable(buf, offset, pairs)
+    offset += pairs * _pair_size
+    blacklist = [hexlify(buf[pos:pos + _id_size])
+                 for pos in xrange(offset, offset + blacklisted * _id_size, _id_size)]
+    offset += blacklisted * _id_size
+
+    extra = {}
+    for line in buf[offset:offset + extrasize].splitlines():
+        fields = line.split(" ", 1)
+        if fields[0] == "-":
+            blacklist.append(fields[1])
+        else:
+            extra.setdefault(fields[0], []).extend(fields[1:])
+    return (hexlify(tip), forward, reverse, blacklist, extra)
+
+
+def write(path, tip, origins, blacklist):
+    """Atomically replace the cache file at ``path``.
+
+    ``origins`` maps each commit SHA1 to the list of its origins as
+    written in its note."""
+    forward = []
+    extra = []
+    for commit in sorted(origins):
+        key = unhexlify(commit)
+        full = [origin for origin in origins[commit] if _sha_re.match(origin)]
+        forward.extend(key + unhexlify(origin) for origin in full)
+        if len(full) < len(origins[commit]):
+            extra.extend("%s %s\n" % (commit, origin)
+                         for origin in origins[commit] if not _sha_re.match(origin))
+        elif not full:
+            extra.append("%s\n" % commit)
+    reverse = sorted(pair[_id_size:] + pair[:_id_size] for pair in forward)
+
+    full = [id for id in blacklist if _sha_re.match(id)]
+    extra.extend("- %s\n" % id for id in blacklist if not _sha_re.match(id))
+    extra = "".join(extra)
+
+    fd, tmppath = mkstemp(prefix=".%s." % basename(path), dir=dirname(path))
+    try:
+        f = os.fdopen(fd, "wb")
+        try:
+            f.write(_header.pack(magic, version, unhexlify(tip),
+                                 len(forward), len(full), len(extra)))
+            f.write("".join(forward))
+            f.write("".join(reverse))
+            f.write("".join(unhexlify(id) for id in full))
+            f.write(extra)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        os.rename(tmppath, path)
+    except:
+        os.unlink(tmppath)
+        raise
@@ -0,0 +1,82 @@
+"""On-disk cache of the classified commits of a comparison of two refs.
+
+Each comparison has its own file, which records the left, right and notes
+tips it was computed for, the merge bases of the two tips, the ids named
+by the notes which didn't exist, and the commits of the range as lines of
+their rev-list side, their direction and their SHA1.  Files are replaced
+atomically.
+"""
+
+import os
+from tempfile import mkstemp
+from os.path import join, dirname, basename
+from errno import EEXIST
+from hashlib import sha1
+
+
+cache_dirname = "origins-cherry"
+version = "2"
+
+
+def cache_path(repo, key):
+    """The path of the cache file of the comparison identified by the
+    given strings."""
+    return join(repo.path, cache_dirname, sha1("\0".join(key)).hexdigest())
+
+
+def read(path):
+    """Read a cache file.
+
+    Returns
+        a tuple of (left tip, right tip, notes tip, list of merge bases,
+        list of (side, direction, SHA1), list of missing ids), or None if
+        there is no usable cache"""
+    try:
+        f = open(path, "rb")
+    except IOError:
+        return
+
+    try:
+        header = f.readline().split()
+        if len(header) != 6 or header[0] != version:
+            return
+        (left, right, notes, bases, missing) = header[1:]
+        commits = [(line[0], line[1], line[2:42]) for line in f]
+    finally:
+        f.close()
+
+    if notes == "-":
+        notes = None
+    if bases == "-":
+        bases = []
+    else:
+        bases = bases.split(",")
+    if missing == "-":
+        missing = []
+    else:
+        missing = missing.split(",")
+    return (left, right, notes, bases, commits, missing)
+
+
+def write(path, left, right, notes, bases, commits, missing=()):
+    """Atomically replace a cache file."""
+    try:
+        os.makedirs(dirname(path))
+    except OSError, exc:
+        if exc.errno != EEXIST:
+            raise
+
+    fd, tmppath = mkstemp(prefix=".%s." % basename(path), dir=dirname(path))
+    try:
+        f = os.fdopen(fd, "wb")
+        try:
+            f.write("%s %s %s %s %s %s\n" % (version, left, right, notes or "-",
+                                             ",".join(bases) or "-",
+                                             ",".join(missing) or "-"))
+            f.write("".join("%s%s%s\n" % commit for commit in commits))
+        finally:
+            f.close()
+        os.rename(tmppath, path)
+    except:
+        os.unlink(tmppath)
+        raise
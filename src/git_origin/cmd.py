@@ -1,16 +1,26 @@
 """Commands to be used as console scripts for the git-origin project."""
 
+from __future__ import with_statement
+import re
 from sys import argv
-from os import makedirs, environ, sep
+from os import makedirs, environ, rename
 from os.path import join, isabs
-from errno import EEXIST
-from sys import exit, stderr
+from errno import EEXIST, EPIPE
+from sys import exit, stderr, stdin, stdout
+try:
+    import json
+except ImportError:
+    import simplejson as json
 from subprocess import call
-from StringIO import StringIO
 from git.repo import Repo
 from git.cmd import Git
 from git.errors import GitCommandError
 from git.commit import Commit
+from git.blob import Blob
+from git_origin import cache, cherrycache
+from git_origin.patchid import PatchIdCache
+from git_origin.notestree import note_name, hash_blobs, write_notes_tree
+from git_origin.similar import find_candidates
 
 
 if "GIT_NOTES_REF" in environ:
@@ -18,31 +28,267 @@ if "GIT_NOTES_REF" in environ:
 
 
 notes_ref = "refs/notes/origins"
+# Number of commits shared through the Repo's commit cache
+commit_cache_size = 100000
 blacklist_filename = "blacklist"
+cache_filename = "origins-cache"
+# Local tips whose history has been scanned for cherry-pick trailers
+trailer_scan_filename = "origins-trailer-scan"
+trailer_scan_tips = 32
+cherry_pick_re = re.compile(r"\(cherry picked from commit ([0-9a-fA-F]{7,40})\)")
+_sha_re = re.compile(r"^[0-9a-f]{40}$")
 origin_usage = """git-origin ORIGIN [COMMIT]
+git-origin --derived ORIGIN
 
 ORIGIN - Commit to mark as an origin.
-COMMIT - Commit which has ORIGIN as an origin (default=HEAD)."""
-blacklist_usage = """git-blacklist COMMIT
-
-COMMIT - Commit to add to the blacklist."""
-cherry_usage = """git-cherry-origins [UPSTREAM [LOCAL]]
-
+COMMIT - Commit which has ORIGIN as an origin (default=HEAD).
+--derived - List the commits which have ORIGIN as an origin, but for the
+            blacklisted ones."""
+blacklist_usage = """git-origin-blacklist [-d] COMMIT...
+git-origin-blacklist [-d] (--stdin | -F FILE)
+
+COMMIT - Commit to add to the blacklist.
+-d - Remove the commits from the blacklist instead.
+--stdin - Read the commits from standard input, one per line.
+-F FILE - Read the commits from FILE, one per line."""
+cherry_usage = """git-cherry-origins [-v] [--stream] [--json] [--count] [UPSTREAM [LOCAL]]
+git-cherry-origins --matrix [-v] [--json] [--count] REF REF...
+
+-v - Show the commit subjects next to the SHA1s.
+--stream - Flush each line once it is printed.  The whole range is still
+          classified first, only the subjects of -v are read as it goes.
+--json - Output a JSON object per line (NDJSON) instead.
+--count - Only output the number of + and - commits.
+--matrix - For every ordered pair of the REFs, list the commits of the first
+           which aren't in the second, after a "FROM -> TO: COUNT" line.
 LOCAL - Local branch to compare against upstream, defaults to HEAD.
 UPSTREAM - Upstream branch to compare against local, defaults to the remote
            the local branch is tracking."""
+suggest_usage = """git-suggest-origins [-t THRESHOLD] [UPSTREAM [LOCAL]]
+
+List likely upstream origins of the local commits which have no origins, as
+"SIMILARITY LOCAL-COMMIT UPSTREAM-COMMIT" lines, the most similar first.
+Similarity is estimated from the changed lines of the commits, from 0 to 1.
+
+-t THRESHOLD - Minimum similarity to list, defaults to 0.5.
+LOCAL - Local branch, defaults to HEAD.
+UPSTREAM - Upstream branch, defaults to the remote the local branch is
+           tracking."""
+populate_usage = """git-populate-origins [--trailers] [UPSTREAM [LOCAL]]
+
+Mark the upstream commits with the same patch-id as a local commit as its
+origins, for the local commits which have no origins yet.
+
+--trailers - Instead, add the commits named in the "(cherry picked from
+             commit ...)" lines of the local commit messages to their
+             origins.  Commits scanned by previous runs are skipped.
+LOCAL - Local branch to populate, defaults to HEAD.
+UPSTREAM - Upstream branch to find the origins in, defaults to the remote
+           the local branch is tracking."""
 
 
 def _commit(repo, ref="HEAD"):
-    return Commit(repo, repo.git.rev_parse(ref, verify=True))
+    return Commit.lookup(repo, repo.rev_parse(ref))
+
+def _commits(repo, *refs):
+    return [Commit.lookup(repo, id) for id in repo.rev_parse_many(refs)]
+
+def _is_blacklist(name):
+    return name == blacklist_filename or name.startswith(blacklist_filename + "/")
+
+def _existing_ids(repo, ids):
+    """Map each of the given object names which exists to its full sha."""
+    ids = list(ids)
+    return dict((id, info[0]) for (id, info) in zip(ids, repo.object_info(ids))
+                if info is not None)
+
+def _note_ids(data):
+    """The ids listed in a note, as written but for the case of full SHA1s.
+    Lines which can't be an object name are skipped."""
+    ids = []
+    for line in data.splitlines():
+        line = line.strip()
+        if not line or "," in line or len(line.split()) > 1:
+            continue
+        if _sha_re.match(line.lower()):
+            line = line.lower()
+        ids.append(line)
+    return ids
+
+class OriginsIndex(object):
+    """In-memory view of the whole notes tree.
 
-def _existing_origins(repo, data):
-    for id in data.splitlines():
+    Shared by every Origins of a repository within the process until the
+    notes ref moves.  It is kept on disk between runs (see git_origin.cache)
+    and brought up to date from the changes between the cached notes
+    commit and the current one, so the whole notes tree is only read, with
+    one recursive listing and one batch read of its blobs, when there is no
+    usable cache.
+
+    The notes are held as written: whether their ids name existing
+    commits is only checked when they are used, since the commits may be
+    fetched later.
+    """
+
+    _loaded = {}
+
+    def __init__(self, repo, tip=None):
+        self.repo = repo
+        self.tip = tip
+        # commit id -> list of origin ids
+        self.origins = {}
+        # origin id -> list of ids of the commits derived from it
+        self.derived = {}
+        # origin ids which aren't full SHA1s
+        self.abbreviated = set()
+        self.blacklist = []
+        self.blacklisted = set()
+        if tip is not None:
+            self._read(tip)
+
+    @classmethod
+    def load(cls, repo):
+        """The index of the current notes tip, reusing the loaded one if the
+        ref hasn't moved."""
         try:
-            id = repo.git.rev_parse(id, verify=True)
-            yield id
+            tip = repo.rev_parse(notes_ref)
         except GitCommandError:
-            continue
+            tip = None
+
+        index = cls._loaded.get(repo.path)
+        if index is None or index.tip != tip:
+            index = cls._loaded[repo.path] = cls._load(repo, tip)
+        return index
+
+    @classmethod
+    def _load(cls, repo, tip):
+        if tip is None:
+            return cls(repo)
+
+        path = join(repo.path, cache_filename)
+        cached = cache.read(path)
+        if cached is not None:
+            index = cls(repo)
+            (index.tip, index.origins, index.derived, index.blacklist, extra) = cached
+            index.blacklisted = set(index.blacklist)
+            if extra:
+                index._unshare()
+                for (commit, ids) in extra.iteritems():
+                    index._set(commit, index.origins.get(commit, []) + ids)
+            if index.tip == tip:
+                return index
+
+            try:
+                index._apply(tip)
+            except GitCommandError:
+                # The cached notes commit is gone, start over
+                index = cls(repo, tip)
+        else:
+            index = cls(repo, tip)
+
+        try:
+            cache.write(path, index.tip, index.origins, index.blacklist)
+        except (IOError, OSError), exc:
+            print >>stderr, "Warning: unable to write %s: %s" % (path, exc)
+        return index
+
+    def _read(self, tip):
+        names, blobids = [], []
+        for line in self.repo.git.ls_tree(tip, r=True).splitlines():
+            info, name = line.split("\t", 1)
+            mode, type, id = info.split()
+            if type == "blob":
+                names.append(note_name(name))
+                blobids.append(id)
+
+        self._add_notes(names, blobids, blacklist=True)
+        self.tip = tip
+
+    def _read_blacklist(self, tip):
+        names, blobids = [], []
+        for line in self.repo.git.ls_tree(tip, "--", blacklist_filename, r=True).splitlines():
+            info, name = line.split("\t", 1)
+            names.append(name)
+            blobids.append(info.split()[2])
+
+        self._add_notes(names, blobids, blacklist=True)
+
+    def _apply(self, tip):
+        """Bring the index from its notes commit to ``tip`` by applying the
+        notes which changed between them."""
+        names, blobids = [], []
+        blacklist = False
+        diff = self.repo.git.diff_tree(self.tip, tip, r=True, no_renames=True)
+        self._unshare()
+        for line in diff.splitlines():
+            info, path = line.split("\t", 1)
+            name = note_name(path)
+            (oldmode, newmode, oldid, newid, status) = info[1:].split()
+            if _is_blacklist(name):
+                blacklist = True
+            elif status == "D":
+                self.update(self.tip, name, None)
+            elif newmode.startswith("100"):
+                names.append(name)
+                blobids.append(newid)
+
+        self._add_notes(names, blobids)
+        if blacklist:
+            # Shards can't be told apart once loaded, so reread them all
+            self._read_blacklist(tip)
+        self.tip = tip
+
+    def _add_notes(self, names, blobids, blacklist=False):
+        """Add the notes of the given blobs.  If ``blacklist`` is set, the
+        blacklist is replaced by the one of the blobs."""
+        blacklisted = []
+        for name, obj in sorted(zip(names, self.repo.object_data(blobids))):
+            if obj is None:
+                continue
+            if _is_blacklist(name):
+                blacklisted.extend(_note_ids(obj[3]))
+            elif _sha_re.match(name):
+                self.update(self.tip, name, _note_ids(obj[3]))
+        if blacklist:
+            self.update(self.tip, blacklist_filename, blacklisted)
+
+    def _unshare(self):
+        """Switch from the mapped cache file to dicts which can be updated."""
+        if not isinstance(self.origins, dict):
+            self.origins = dict(self.origins.iteritems())
+            self.derived = dict(self.derived.iteritems())
+
+    def _set(self, commit, origins):
+        self._remove(commit)
+        self.origins[commit] = origins
+        for origin in origins:
+            self.derived.setdefault(origin, []).append(commit)
+            if not _sha_re.match(origin):
+                self.abbreviated.add(origin)
+
+    def _remove(self, commit):
+        for origin in self.origins.pop(commit, ()):
+            derived = self.derived[origin]
+            derived.remove(commit)
+            if not derived:
+                del self.derived[origin]
+                self.abbreviated.discard(origin)
+
+    def update(self, tip, commit, origins):
+        """Record a change committed to the notes ref as ``tip``.
+
+        ``origins`` is the new list of origin ids of ``commit``, or None if
+        its note was removed."""
+        self._unshare()
+        if commit == blacklist_filename:
+            self.blacklist = list(origins or ())
+            self.blacklisted = set(self.blacklist)
+        elif origins is None:
+            self._remove(commit)
+        else:
+            self._set(commit, list(origins))
+        self.tip = tip
+
 
 class Index(object):
     def __init__(self, repo, path=None):
@@ -135,7 +381,7 @@ class Origins(object):
         print(self.repo.git.fetch(remote))
 
         try:
-            notes = self.repo.git.rev_parse(self.ref, verify=True)
+            notes = self.repo.rev_parse(self.ref)
         except GitCommandError:
             self.repo.git.update_ref(self.ref, remote_ref)
             return
@@ -147,61 +393,234 @@ class Origins(object):
         self.index.merge_index("-o", "git-merge-origins-driver", "-a")
         self._commit("Merge %s" % remote_ref, "-p", remote_ref)
 
+    @property
+    def notes(self):
+        return OriginsIndex.load(self.repo)
+
     def _commit(self, msg, *commitargs):
-        parent = _commit(self.repo, self.ref)
-        newtreeid = self.index.write_tree()
+        return self._commit_tree(self.index.write_tree(), msg, *commitargs)
+
+    def _commit_tree(self, newtreeid, msg, *commitargs):
+        try:
+            parent = _commit(self.repo, self.ref)
+        except GitCommandError:
+            # The first notes commit
+            newcommitid = self.repo.git.commit_tree(newtreeid, input=msg, *commitargs)
+            self.repo.git.update_ref(self.ref, newcommitid)
+            return Commit.lookup(self.repo, newcommitid)
+
         if newtreeid != parent.tree.id:
             newcommitid = self.repo.git.commit_tree(newtreeid, "-p", parent.id,
                                                     input=msg, *commitargs)
             self.repo.git.update_ref(self.ref, newcommitid)
-            return self.repo.commit(newcommitid)
+            return Commit.lookup(self.repo, newcommitid)
 
     def _checkout(self):
         self.index.read_tree(self.ref)
         self.index.checkout(self.wd, a=True, f=True)
 
     def __getitem__(self, commit):
-        head = _commit(self.repo, self.ref)
-        try:
-            blob = head.tree[str(commit)]
-        except KeyError:
-            return
+        commit = str(commit)
+        notes = self.notes
+        if commit == blacklist_filename:
+            ids = notes.blacklist
+        else:
+            ids = notes.origins.get(commit)
+            if ids is None:
+                return
 
-        return (Commit(self.repo, id) for id in _existing_origins(self.repo, blob.data))
+        # Only the commits which exist, as they may not have been fetched
+        existing = _existing_ids(self.repo, ids)
+        origins = [Commit.lookup(self.repo, existing[id]) for id in ids if id in existing]
+        return iter(Commit.bake_together(origins))
 
-    def __setitem__(self, commit, origins):
-        msg = "Set origins for %s\n\nOrigins:\n%s"
-        origindata = "\n".join(c.id for c in origins)
+    def batch(self, msg=None):
+        """Collect changes to be committed as a single notes commit.
 
-        self.index.read_tree(self.ref)
-        self.index.data_update(str(commit), origindata, add=True)
-        self._commit(msg % (commit, origindata))
+        Used as a context manager, the changes are committed when the
+        block ends without an exception:
+
+            with origins.batch() as batch:
+                batch[commit] = [origin]
+                del batch[othercommit]
+                batch.blacklist(internalcommit)
+        """
+        return OriginsBatch(self, msg)
+
+    def __setitem__(self, commit, origins):
+        with self.batch() as batch:
+            batch[commit] = origins
 
     def __delitem__(self, commit):
-        self.index.read_tree(self.ref)
-        self.index.update(str(commit), force_remove=True)
-        self._commit("Remove origins for %s" % commit)
+        with self.batch() as batch:
+            del batch[commit]
 
     def __iter__(self):
-        self.index.read_tree(self.ref)
-        commitids = self.index.git.ls_files().splitlines()
-        return (self.repo.commit(c) for c in commitids if c.strip() != blacklist_filename)
+        commits = [Commit.lookup(self.repo, c) for c in sorted(self.notes.origins)]
+        return iter(Commit.bake_together(commits))
+
+
+class OriginsBatch(object):
+    """Changes to the origins which are committed together, see
+    Origins.batch."""
+
+    def __init__(self, origins, msg=None):
+        self.origins = origins
+        self.msg = msg
+        # commit id -> list of origin ids, or None to remove the note
+        self.changes = {}
+        self.blacklisted = []
+        self.unblacklisted = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.commit()
+
+    def __setitem__(self, commit, origins):
+        self.changes[str(commit)] = [str(c) for c in origins]
+
+    def __delitem__(self, commit):
+        self.changes[str(commit)] = None
+
+    def blacklist(self, commit):
+        commit = str(commit)
+        if commit in self.unblacklisted:
+            self.unblacklisted.remove(commit)
+        if commit not in self.blacklisted:
+            self.blacklisted.append(commit)
+
+    def unblacklist(self, commit):
+        commit = str(commit)
+        if commit in self.blacklisted:
+            self.blacklisted.remove(commit)
+        if commit not in self.unblacklisted:
+            self.unblacklisted.append(commit)
+
+    def _message(self, changes, added, removed):
+        if self.msg is not None:
+            return self.msg
+
+        lines = []
+        for (commit, origins) in sorted(changes.iteritems()):
+            if origins is None:
+                lines.append("Remove origins for %s" % commit)
+            else:
+                lines.append("Set origins for %s\n\nOrigins:\n%s" % (commit, "\n".join(origins)))
+        lines.extend("Add %s to the blacklist" % id for id in added)
+        lines.extend("Remove %s from the blacklist" % id for id in removed)
+
+        if len(lines) == 1:
+            return lines[0]
+        return "Update origins for %d commits\n\n%s" % (len(lines), "\n".join(l.split("\n")[0] for l in lines))
+
+    def commit(self):
+        """Commit the collected changes as one notes commit.
+
+        Returns
+            the new notes commit, or None if nothing changed"""
+        repo = self.origins.repo
+        notes = self.origins.notes
+        changes = self.changes
+        added = [id for id in self.blacklisted if id not in notes.blacklisted]
+        removed = [id for id in self.unblacklisted if id in notes.blacklisted]
+        self.changes = {}
+        self.blacklisted = []
+        self.unblacklisted = []
+        if not changes and not added and not removed:
+            return
+
+        # note path -> data, or None to remove the note
+        datas = {}
+        for (commit, origins) in changes.iteritems():
+            if origins is None:
+                datas[commit] = None
+            else:
+                datas[commit] = "\n".join(origins)
+
+        blacklist = None
+        if added or removed:
+            removedset = set(removed)
+            blacklist = [id for id in notes.blacklist if id not in removedset] + added
+            shards = set(id[:2] for id in added + removed)
+            if notes.tip is not None:
+                info = repo.object_info(["%s:%s" % (notes.tip, blacklist_filename)])[0]
+                if info is not None and info[1] == "blob":
+                    # Migrate the single blacklist blob to shards
+                    datas[blacklist_filename] = None
+                    shards.update(id[:2] for id in blacklist)
+            datas.update(_blacklist_shards(blacklist, shards))
+
+        hashes = hash_blobs(repo, (data for data in datas.itervalues() if data is not None))
+        blobs = dict((path, data is not None and hashes[data] or None)
+                     for (path, data) in datas.iteritems())
+        tree = write_notes_tree(repo, notes.tip, blobs, len(notes.origins))
+        new = self.origins._commit_tree(tree, self._message(changes, added, removed))
+        if new is not None:
+            for (commit, origins) in changes.iteritems():
+                notes.update(new.id, commit, origins)
+            if blacklist is not None:
+                notes.update(new.id, blacklist_filename, blacklist)
+        return new
+
+
+def _blacklist_shards(blacklist, shards):
+    """The contents of the given shards of the blacklist.
+
+    The blacklist is stored as blobs named blacklist/<first two hex digits>,
+    each listing the sorted ids of its shard, so adding to it only
+    rewrites one small blob, and the merge driver can merge shards line by
+    line.
+
+    Returns
+        dict of shard path to data, or to None for an empty shard"""
+    ids = {}
+    for id in blacklist:
+        if id[:2] in shards:
+            ids.setdefault(id[:2], []).append(id)
+
+    datas = {}
+    for shard in shards:
+        path = "%s/%s" % (blacklist_filename, shard)
+        if shard in ids:
+            datas[path] = "\n".join(sorted(ids[shard])) + "\n"
+        else:
+            datas[path] = None
+    return datas
 
 
 def add_origin(repo, origin, commit="HEAD"):
-    origin, commit = (_commit(repo, origin), _commit(repo, commit))
+    origin, commit = _commits(repo, origin, commit)
 
     origindata = Origins(repo)
-    origins = list(origindata[commit] or "")
+    origins = origindata[commit] or ()
 
     if not origin.id in set(c.id for c in origins):
-        origins.append(origin)
-        origindata[commit] = origins
+        # Keep the origins of the note which haven't been fetched
+        ids = list(origindata.notes.origins.get(commit.id, ()))
+        origindata[commit] = ids + [origin.id]
         print("Added origin %s to commit %s" % (origin, commit))
     else:
         print("Origin already set")
 
 
+def derived_commits(repo, origin):
+    """The ids of the commits which have the given commit-ish as an origin.
+    As when classifying, the notes of blacklisted commits don't count."""
+    origin = _commit(repo, origin)
+    notes = OriginsIndex.load(repo)
+    derived = list(notes.derived.get(origin.id, ()))
+
+    # Notes may name the origin by an abbreviated id
+    (existing, partial, unknown) = _resolve_notes(notes, notes.abbreviated)
+    for (id, sha) in sorted(existing.iteritems()):
+        if sha == origin.id:
+            derived.extend(c for c in notes.derived[id] if c not in derived)
+    return [id for id in derived if id not in notes.blacklisted and id not in partial]
+
+
 # Commands
 def origin():
     """Add the supplied commit-ish as an origin on HEAD (or the second supplied commit-ish)."""
@@ -209,8 +628,15 @@ def origin():
     if "GIT_NOTES_REF" in environ:
         del environ["GIT_NOTES_REF"]
 
-    if 1 < len(argv) < 4:
-        repo = Repo()
+    if len(argv) == 3 and argv[1] == "--derived":
+        repo = Repo(commit_cache_size=commit_cache_size)
+        try:
+            for id in derived_commits(repo, argv[2]):
+                print(id)
+        except GitCommandError, exc:
+            exit("Failed to look up derived commits when executing %s:\n%s" % (exc.command, exc.stderr))
+    elif 1 < len(argv) < 4:
+        repo = Repo(commit_cache_size=commit_cache_size)
         try:
             add_origin(repo, *argv[1:])
         except GitCommandError, exc:
@@ -220,142 +646,757 @@ def origin():
         exit(2)
 
 
-def add_blacklist(repo, commit):
-    commit = _commit(repo, commit)
+def update_blacklist(repo, commits, remove=False):
+    """Add many commit-ishes to the blacklist, or remove them from it if
+    ``remove`` is set, as a single notes commit.
 
+    Returns
+        list of the ids of the commits which were added or removed"""
     origindata = Origins(repo)
-    bldata = list(origindata[blacklist_filename] or "")
+    blacklisted = origindata.notes.blacklisted
 
-    if not commit.id in set(c.id for c in bldata):
-        bldata.append(commit)
-        origindata[blacklist_filename] = bldata
-        print("Added commit %s to blacklist" % commit)
+    changed = []
+    for id in repo.rev_parse_many(commits):
+        if (id in blacklisted) == remove and id not in changed:
+            changed.append(id)
+
+    if changed:
+        with origindata.batch() as batch:
+            for id in changed:
+                if remove:
+                    batch.unblacklist(id)
+                else:
+                    batch.blacklist(id)
+    return changed
+
+
+def add_blacklist(repo, commit):
+    if update_blacklist(repo, [commit]):
+        print("Added commit %s to blacklist" % repo.rev_parse(commit))
     else:
         print("Commit already in the blacklist")
 
 
 def blacklist():
-    """Add the supplied commit-ish to the blacklist."""
-
-    if len(argv) == 2:
-        repo = Repo()
+    """Add the supplied commit-ishes to the blacklist, or remove them from it."""
+
+    args = argv[1:]
+    remove = "-d" in args
+    if remove:
+        args.remove("-d")
+
+    if "--stdin" in args:
+        args.remove("--stdin")
+        commits = stdin.read().split()
+    elif "-F" in args:
+        i = args.index("-F")
         try:
-            add_blacklist(repo, argv[1])
-        except GitCommandError, exc:
-            exit("Failed to add commit to blacklist when executing %s:\n%s" % (exc.command, exc.stderr))
+            commits = open(args[i + 1]).read().split()
+        except IndexError:
+            print >>stderr, blacklist_usage
+            exit(2)
+        except IOError, exc:
+            exit("Unable to read %s: %s" % (args[i + 1], exc.strerror))
+        del args[i:i + 2]
     else:
+        commits = args
+        args = []
+
+    if not commits or args:
         print >>stderr, blacklist_usage
         exit(2)
 
+    repo = Repo(commit_cache_size=commit_cache_size)
+    try:
+        if len(commits) == 1 and not remove:
+            add_blacklist(repo, commits[0])
+        else:
+            changed = update_blacklist(repo, commits, remove)
+            if remove:
+                print("Removed %d commits from the blacklist" % len(changed))
+            else:
+                print("Added %d commits to the blacklist" % len(changed))
+    except GitCommandError, exc:
+        exit("Failed to update the blacklist when executing %s:\n%s" % (exc.command, exc.stderr))
 
-def left_right(repo, left, right, *args):
-    def _rev_left_right(left, right):
-        if args:
-            revinfo = repo.git.rev_list("%s...%s" % (left, right), left_right=True, *args)
+
+def iter_classify(repo, left, right, *args):
+    """Classify the commits of the symmetric difference of two commits.
+
+    Works on SHA1 strings only: one streamed rev-list --left-right, the
+    origins index, and set operations between the two, without any git
+    process or Commit object per commit or origin.  It is meant to handle
+    at least 1M commits in the symmetric difference, with memory linear in
+    the number of commits.
+
+    A commit is marked "-" (present on both sides) if it is blacklisted,
+    if it is an origin of another commit of the range, or if it has a note
+    and all of the origins of the note which exist are in the range.
+    Otherwise it keeps its rev-list side, "<" for left and ">" for right.
+
+    The rev-list output is read first, since a commit can only be
+    classified once it is known which commits are in the range.  The
+    commits are then yielded one at a time as they are classified.
+
+    Returns
+        iterator of (direction, commit id) in rev-list order
+    """
+    commits = _rev_left_right(repo, "%s...%s" % (left, right), *args)
+    return _classify_range(OriginsIndex.load(repo), commits)
+
+
+def _rev_left_right(repo, *args):
+    revs = repo.git.rev_list(left_right=True, as_process=True, *args)
+    commits = [(line[0], line[1:41]) for line in revs.stdout]
+    revs.wait()
+    return commits
+
+
+def _resolve_notes(notes, ids):
+    """Look up the given origin ids, along with the blacklist entries which
+    aren't full SHA1s, with a single git process.
+
+    As with git rev-parse --verify, full SHA1s are taken as they are,
+    whether or not their commits were fetched: only the other ids are
+    looked up.
+
+    Returns
+        tuple of (dict of each id which resolves to its full SHA1, set of
+        the full SHA1s of the blacklist entries which aren't full SHA1s,
+        set of the ids which don't resolve)"""
+    ids = set(ids)
+    resolved = dict((id, id) for id in ids if _sha_re.match(id))
+    partial = [id for id in notes.blacklist if not _sha_re.match(id)]
+    ids = (ids - set(resolved)) | set(partial)
+    if not ids:
+        return (resolved, set(), set())
+
+    existing = _existing_ids(notes.repo, ids)
+    blacklisted = set(existing[id] for id in partial if id in existing)
+    resolved.update(existing)
+    return (resolved, blacklisted, ids - set(existing))
+
+
+def _classify_range(notes, commits, missing=None):
+    """Classify (side, commit id) pairs of a range, see ``iter_classify``.
+
+    The origins which aren't in the range are resolved with a single git
+    process once the notes of the range are known, see ``_resolve_notes``:
+    full SHA1s count as origins outside of the range even if they weren't
+    fetched, and the other ids only if they name an object.  If
+    ``missing`` is given, the ids which don't resolve are added to it."""
+    positions = set(id for (direction, id) in commits)
+    marked = set(id for id in notes.blacklisted if id in positions)
+
+    # Walk whichever of the notes and the range is smaller
+    if len(notes.origins) < len(positions):
+        noted = ((id, origins) for (id, origins) in notes.origins.iteritems()
+                 if id in positions)
+    else:
+        noted = ((id, notes.origins.get(id)) for id in positions)
+
+    outside = []
+    for (id, origins) in noted:
+        if origins is None or id in notes.blacklisted:
+            continue
+
+        inrange = [o for o in origins if o in positions]
+        marked.update(inrange)
+        if len(inrange) == len(origins):
+            marked.add(id)
+        else:
+            outside.append((id, [o for o in origins if o not in positions]))
+
+    (existing, blacklisted, unknown) = _resolve_notes(notes, (o for (id, origins) in outside
+                                                              for o in origins))
+    if missing is not None:
+        missing.extend(sorted(unknown))
+    marked.update(id for id in blacklisted if id in positions)
+    for (id, origins) in outside:
+        origins = [existing[o] for o in origins if o in existing]
+        inrange = [o for o in origins if o in positions]
+        marked.update(inrange)
+        if len(inrange) == len(origins):
+            marked.add(id)
+
+    for (direction, id) in commits:
+        if id in marked:
+            yield ("-", id)
         else:
-            revinfo = repo.git.rev_list("%s...%s" % (left, right), left_right=True)
-
-        for rev in revinfo.splitlines():
-            c = Commit(repo, rev[1:])
-            c.direction = rev[0]
-            yield c
-
-    def _origins_batch(commits):
-        blobs = "\n".join("%s:%s" % (notes_ref, c) for c in commits)
-        contentstr = repo.git.cat_file(batch=True, input=blobs)
-        content = StringIO(contentstr)
-        while content:
-            line = content.readline().rstrip()
-            if not line:
-                break
-
-            words = line.split()
-            if words[1] == "missing":
-                yield None
+            yield (direction, id)
+
+
+def classify(repo, left, right, *args):
+    """The list of (direction, commit id) of ``iter_classify``."""
+    return list(iter_classify(repo, left, right, *args))
+
+
+def cherry_matrix(repo, refs):
+    """Classify the commits between every ordered pair of the given refs.
+
+    History is walked once for all the refs: a single rev-list
+    --topo-order --parents of the commits which aren't reachable from all
+    of them, in which each commit gets a bitmask of the refs it is
+    reachable from, passed on from children to parents.  The origins are
+    loaded once, and the noted commits of the walk are looked up once and
+    shared by all the pairs.  Each pair then only tests the masks of its
+    commits, as ``_classify_range`` does with the range of two refs.
+
+    Returns
+        dict of (from ref, to ref) to the list of ids of the commits of
+        ``from`` which aren't in ``to`` and aren't marked as present on
+        both, oldest first
+    """
+    tips = repo.rev_parse_many(refs)
+    bases = repo.git.merge_base(octopus=True, all=True,
+                                with_exceptions=False, *tips).split()
+
+    masks = {}
+    for (i, tip) in enumerate(tips):
+        masks[tip] = masks.get(tip, 0) | 1 << i
+
+    # Children come before their parents, so the mask of a commit is
+    # complete by the time its line is read
+    order = []
+    revs = repo.git.rev_list(topo_order=True, parents=True, as_process=True,
+                             *(tips + ["--not"] + bases))
+    for line in revs.stdout:
+        ids = line.split()
+        mask = masks.get(ids[0], 0)
+        order.append((ids[0], mask))
+        for parent in ids[1:]:
+            masks[parent] = masks.get(parent, 0) | mask
+    revs.wait()
+    masks = dict(order)
+
+    # Commits by the set of refs they are reachable from, oldest first
+    bymask = {}
+    position = {}
+    for (id, mask) in reversed(order):
+        position[id] = len(position)
+        bymask.setdefault(mask, []).append(id)
+
+    notes = OriginsIndex.load(repo)
+    if len(notes.origins) < len(masks):
+        noted = [(id, origins) for (id, origins) in notes.origins.iteritems()
+                 if id in masks]
+    else:
+        noted = [(id, notes.origins.get(id)) for id in masks]
+    noted = [(id, origins) for (id, origins) in noted
+             if origins is not None and id not in notes.blacklisted]
+
+    # The origins outside of the walk only count if they resolve
+    (existing, partial, unknown) = _resolve_notes(notes, (o for (id, origins) in noted
+                                                          for o in origins if o not in masks))
+    blacklisted = [id for id in notes.blacklisted | partial if id in masks]
+    for (i, (id, origins)) in enumerate(noted):
+        origins = [o in masks and o or existing[o] for o in origins
+                   if o in masks or o in existing]
+        noted[i] = (id, masks[id], origins, [masks.get(o, 0) for o in origins])
+
+    result = {}
+    for (i, left) in enumerate(refs):
+        for (j, right) in enumerate(refs):
+            if i == j:
                 continue
+            lbit, rbit = 1 << i, 1 << j
+            inrange = lambda mask: bool(mask & lbit) != bool(mask & rbit)
+
+            marked = set(id for id in blacklisted if inrange(masks[id]))
+            for (id, mask, origins, omasks) in noted:
+                if not inrange(mask):
+                    continue
+                inorigins = [o for (o, omask) in zip(origins, omasks) if inrange(omask)]
+                marked.update(inorigins)
+                if len(inorigins) == len(origins):
+                    marked.add(id)
+
+            unported = []
+            for (mask, ids) in bymask.iteritems():
+                if mask & lbit and not mask & rbit:
+                    unported.extend(id for id in ids if id not in marked)
+            unported.sort(key=position.get)
+            result[(left, right)] = unported
+    return result
+
+
+def _is_ancestor(repo, ancestor, commit):
+    status = repo.git.merge_base(ancestor, commit, is_ancestor=True,
+                                 with_exceptions=False, with_extended_output=True)[0]
+    return status == 0
+
+
+def cached_classify(repo, left, right, *args):
+    """``classify`` for two refs, through a result cached per comparison.
+
+    The cached result is returned as is if neither ref nor the notes
+    moved.  If the refs only moved forward without changing their merge
+    bases, only the new commits are listed by git and added to the cached
+    range.  The range is then classified again in memory from the origins
+    index, which follows the notes by applying their changes.  Otherwise
+    the whole range is listed again.
+
+    The ids named by the notes which didn't resolve are recorded with the
+    result, which is classified again once any of them was fetched.
+    """
+    path = cherrycache.cache_path(repo, (left, right) + args)
+    lefttip, righttip = repo.rev_parse_many([left, right])
+    notes = OriginsIndex.load(repo)
+
+    cached = cherrycache.read(path)
+    if cached is not None and cached[:2] == (lefttip, righttip):
+        if cached[2] == notes.tip and not _existing_ids(repo, cached[5]):
+            return [(direction, id) for (side, direction, id) in cached[4]]
+
+        # Only the notes, or which of the commits they name exist, changed
+        commits = [(side, id) for (side, direction, id) in cached[4]]
+        bases = cached[3]
+        return _cache_classified(repo, path, (lefttip, righttip), notes, bases, commits)
+
+    bases = repo.git.merge_base(lefttip, righttip, all=True,
+                                with_exceptions=False).split()
+    if cached is not None and sorted(cached[3]) == sorted(bases) and \
+       _is_ancestor(repo, cached[0], lefttip) and \
+       _is_ancestor(repo, cached[1], righttip):
+        new = _rev_left_right(repo, "%s...%s" % (lefttip, righttip), "--not",
+                              cached[0], cached[1], *args)
+        old = [(side, id) for (side, direction, id) in cached[4]]
+        if "--reverse" in args:
+            commits = old + new
+        else:
+            commits = new + old
+    else:
+        commits = _rev_left_right(repo, "%s...%s" % (lefttip, righttip), *args)
 
-            (hash, type, size) = words
-            data = content.read(int(size))
-            content.read(1) # Kill the trailing LF
+    return _cache_classified(repo, path, (lefttip, righttip), notes, bases, commits)
 
-            yield (Commit(repo, sha1) for sha1 in _existing_origins(repo, data))
 
-    commits = list(_rev_left_right(left, right))
-    commitmap = dict((c.id, c) for c in commits)
-    commitids = set(c.id for c in commits)
-    origindata = dict(zip(commits, _origins_batch(commits)))
-    blorigins = Origins(repo)[blacklist_filename]
-    if blorigins:
-        blacklist = set(c.id for c in blorigins)
-    else:
-        blacklist = set()
+def _cache_classified(repo, path, tips, notes, bases, commits):
+    missing = []
+    classified = list(_classify_range(notes, commits, missing))
+    try:
+        cherrycache.write(path, tips[0], tips[1], notes.tip, bases,
+                          [(side, direction, id) for ((side, i), (direction, id))
+                           in zip(commits, classified)], missing)
+    except (IOError, OSError), exc:
+        print >>stderr, "Warning: unable to write %s: %s" % (path, exc)
+    return classified
 
-    for (commit, origins) in origindata.iteritems():
-        if commit.id in blacklist:
-            commit.direction = "-"
-        elif origins is not None:
-            for o in origins:
-                if o.id in commitmap:
-                    commitmap[o.id].direction = "-"
 
-            if all(o.id in commitids for o in origins):
-                commit.direction = "-"
+def left_right(repo, left, right, *args):
+    """The commits of the symmetric difference of two commits, each with
+    its ``direction`` set as by ``classify``."""
+    commits = []
+    for (direction, id) in classify(repo, left, right, *args):
+        commit = Commit.lookup(repo, id)
+        commit.direction = direction
+        commits.append(commit)
+    return Commit.bake_together(commits)
 
-    return commits
+
+def _tracked_upstream(repo):
+    headref = repo.git.rev_parse("HEAD", symbolic_full_name=True)
+    if not headref:
+        exit("Must supply upstream ref when using a detached HEAD.")
+
+    upstream = repo.git.for_each_ref(headref, format="%(upstream)")
+    if not upstream:
+        exit("No remote tracking branch for this branch, please supply upstream ref.")
+    return upstream
 
 
 def cherry():
     """Display a git-cherry-like view of the commits between two branches."""
 
-    args = len(argv)
-    repo = Repo()
+    args = argv[1:]
+    options = {}
+    for option in ("-v", "--stream", "--json", "--count", "--matrix"):
+        options[option] = option in args
+        if options[option]:
+            args.remove(option)
+    verbose = options["-v"]
+    repo = Repo(commit_cache_size=commit_cache_size)
+
+    if options["--matrix"]:
+        if len(args) < 2:
+            print >>stderr, cherry_usage
+            exit(2)
+        try:
+            _print_matrix(repo, args, options)
+        except GitCommandError, exc:
+            exit("Failed to compare the branches when executing %s:\n%s" % (exc.command, exc.stderr))
+        except IOError, exc:
+            if exc.errno != EPIPE:
+                raise
+        return
+
+    if len(args) > 0:
+        upstream = args[0]
+    else:
+        upstream = _tracked_upstream(repo)
 
-    if args > 1:
-        upstream = argv[1]
+    if len(args) > 1:
+        local = args[1]
     else:
-        headref = repo.git.rev_parse("HEAD", symbolic_full_name=True)
-        if not headref:
-            exit("Must supply upstream ref when using a detached HEAD.")
+        local = "HEAD"
+
+    try:
+        # Oldest first, like git-cherry
+        commits = cached_classify(repo, upstream, local, "--reverse", *args[2:])
+        commits = ((direction == ">" and "+" or direction, id)
+                   for (direction, id) in commits if direction != "<")
+
+        if options["--count"]:
+            counts = {"+": 0, "-": 0}
+            for (direction, id) in commits:
+                counts[direction] += 1
+            if options["--json"]:
+                print(json.dumps(counts, sort_keys=True))
+            else:
+                print("+ %d\n- %d" % (counts["+"], counts["-"]))
+            return
+
+        if verbose:
+            commits = _with_commits(repo, commits)
+        else:
+            commits = ((direction, id, None) for (direction, id) in commits)
+
+        for (direction, id, commit) in commits:
+            if options["--json"]:
+                entry = {"direction": direction, "commit": id}
+                if verbose:
+                    entry["subject"] = commit.summary
+                print(json.dumps(entry, sort_keys=True))
+            elif verbose:
+                print("%s %s %s" % (direction, id, commit.summary))
+            else:
+                print("%s %s" % (direction, id))
+
+            if options["--stream"]:
+                stdout.flush()
+    except GitCommandError, exc:
+        exit("Failed to display commits when executing %s:\n%s" % (exc.command, exc.stderr))
+    except IOError, exc:
+        # The reader went away, e.g. head
+        if exc.errno != EPIPE:
+            raise
+
+
+def _print_matrix(repo, refs, options):
+    verbose = options["-v"]
+    matrix = cherry_matrix(repo, refs)
+    for left in refs:
+        for right in refs:
+            if left == right:
+                continue
+            unported = matrix[(left, right)]
+            if options["--count"]:
+                commits = []
+            elif verbose:
+                commits = _with_commits(repo, (("+", id) for id in unported))
+            else:
+                commits = (("+", id, None) for id in unported)
+
+            if options["--json"]:
+                entry = {"from": left, "to": right, "count": len(unported)}
+                if not options["--count"]:
+                    entry["commits"] = [verbose and {"commit": id, "subject": commit.summary} or id
+                                        for (direction, id, commit) in commits]
+                print(json.dumps(entry, sort_keys=True))
+                continue
+
+            print("%s -> %s: %d" % (left, right, len(unported)))
+            for (direction, id, commit) in commits:
+                if verbose:
+                    print("%s %s %s" % (direction, id, commit.summary))
+                else:
+                    print("%s %s" % (direction, id))
+
+
+def _with_commits(repo, commits, chunk=1000):
+    """Yield (direction, id, Commit) for (direction, id) pairs, baking the
+    commits a chunk at a time with a single git process per chunk."""
+    pending = []
+    for (direction, id) in commits:
+        pending.append((direction, id, Commit.lookup(repo, id)))
+        if len(pending) == chunk:
+            Commit.bake_many(repo, [c for (d, i, c) in pending])
+            for item in pending:
+                yield item
+            pending = []
+
+    Commit.bake_many(repo, [c for (d, i, c) in pending])
+    for item in pending:
+        yield item
+
+def populate_origins(repo, upstream, local, *args):
+    """Record the upstream commits with the same patch-id as a local commit
+    as its origins, for each local commit which has no origins yet.
+
+    The patch-ids come from the persistent patch-id cache, so only the
+    commits it hasn't seen yet are diffed, and are joined on a hash of the
+    upstream patch-ids.  All the origins found are recorded as a single
+    notes commit.  Returns the number of commits given origins."""
+    upstream_commits = repo.git.rev_list("%s..%s" % (local, upstream), no_merges=True, *args).split()
+    local_commits = repo.git.rev_list("%s..%s" % (upstream, local), no_merges=True, *args).split()
+    pids = PatchIdCache(repo).patch_ids(upstream_commits + local_commits)
+
+    upstream_ids = {}
+    for commit in reversed(upstream_commits):
+        if commit in pids:
+            upstream_ids.setdefault(pids[commit], []).append(commit)
+
+    origins = Origins(repo)
+    notes = origins.notes
+    count = 0
+    msg = "Populate origins by patch-id\n\nUpstream: %s\nLocal: %s" % (upstream, local)
+    with origins.batch(msg) as batch:
+        for commit in local_commits:
+            pid = pids.get(commit)
+            if pid in upstream_ids and commit not in notes.origins and \
+               commit not in notes.blacklisted:
+                batch[commit] = upstream_ids[pid]
+                count += 1
+    return count
+
+
+def iter_cherry_pick_trailers(repo, *args):
+    """Yield (commit id, list of origin ids) for the commits of a revision
+    range made with git cherry-pick -x, from a single streamed git log.
+
+    The origin ids are given as they appear in the messages, and may be
+    abbreviated or name commits which don't exist in this repository."""
+    log = repo.git.log(format="%x00%H%n%B", fixed_strings=True, no_color=True,
+                       grep="cherry picked from commit", as_process=True, *args)
+
+    commit, origins = None, []
+    for line in log.stdout:
+        if line.startswith("\0"):
+            if origins:
+                yield (commit, origins)
+            commit, origins = line[1:].strip(), []
+        else:
+            origins.extend(cherry_pick_re.findall(line))
+    if origins:
+        yield (commit, origins)
+    log.wait()
+
+
+def populate_trailers(repo, upstream, local):
+    """Add the origins named by the cherry-pick trailers of the commits in
+    upstream..local to their origins, as a single notes commit.
+
+    Full SHA1s are recorded as written, even if the commits haven't been
+    fetched yet.  Abbreviated ids are recorded once they resolve.
+
+    The local tips scanned are remembered, and their history is skipped
+    by later runs, which stays correct as long as upstream only moves
+    forward.  A tip isn't remembered if some of the abbreviated ids found
+    didn't resolve, so that they are looked up again by the next run.
+    Returns the number of commits given new origins."""
+    path = join(repo.path, trailer_scan_filename)
+    try:
+        scanned = open(path).read().split()
+    except IOError:
+        scanned = []
+    scanned = [id for (id, info) in zip(scanned, repo.object_info(scanned)) if info]
+
+    args = ["%s..%s" % (upstream, local)]
+    if scanned:
+        args.append("--not")
+        args.extend(scanned)
+    found = list(iter_cherry_pick_trailers(repo, *args))
+
+    abbreviated = set(id for (commit, ids) in found for id in ids
+                      if not _sha_re.match(id.lower()))
+    existing = _existing_ids(repo, abbreviated)
+    origins = Origins(repo)
+    notes = origins.notes
+    count = 0
+    with origins.batch("Populate origins from cherry-pick trailers\n\nLocal: %s" % local) as batch:
+        for (commit, ids) in found:
+            current = list(notes.origins.get(commit, ()))
+            new = current[:]
+            for id in ids:
+                id = existing.get(id, id.lower())
+                if _sha_re.match(id) and id not in new:
+                    new.append(id)
+            if new != current:
+                batch[commit] = new
+                count += 1
+
+    if len(existing) < len(abbreviated):
+        return count
+
+    scanned = [local] + [id for id in scanned if id != local]
+    tmppath = path + ".tmp"
+    open(tmppath, "w").write("\n".join(scanned[:trailer_scan_tips]) + "\n")
+    rename(tmppath, path)
+    return count
+
+
+def populate():
+    """Populate the origins of the local commits from the patch-ids of the upstream ones."""
+
+    args = argv[1:]
+    if "-h" in args or "--help" in args:
+        print >>stderr, populate_usage
+        exit(2)
 
-        upstream = repo.git.for_each_ref(headref, format="%(upstream)")
-        if not upstream:
-            exit("No remote tracking branch for this branch, please supply upstream ref.")
+    trailers = "--trailers" in args
+    if trailers:
+        args.remove("--trailers")
 
-    if args > 2:
-        local = argv[2]
+    repo = Repo(commit_cache_size=commit_cache_size)
+    if len(args) > 0:
+        upstream = args[0]
+    else:
+        upstream = _tracked_upstream(repo)
+
+    if len(args) > 1:
+        local = args[1]
     else:
         local = "HEAD"
 
     try:
-        upstream, local = (_commit(repo, upstream), _commit(repo, local))
-        extra = argv[3:]
-        if extra:
-            commits = reversed(left_right(repo, upstream, local, *extra))
+        upstream, local = repo.rev_parse_many([upstream, local])
+        if trailers:
+            count = populate_trailers(repo, upstream, local)
         else:
-            commits = reversed(left_right(repo, upstream, local))
+            count = populate_origins(repo, upstream, local, *args[2:])
+    except GitCommandError, exc:
+        exit("Failed to populate origins when executing %s:\n%s" % (exc.command, exc.stderr))
+    print("Added origins to %d commits" % count)
+
+
+def suggest_origins(repo, upstream, local, threshold=0.5, *args):
+    """Propose origins among the upstream commits for the local commits
+    which have no note, see ``find_candidates``."""
+    notes = OriginsIndex.load(repo)
+    localids, upstreamids = [], []
+    for (direction, id) in classify(repo, upstream, local, *args):
+        if direction == ">" and id not in notes.origins:
+            localids.append(id)
+        elif direction == "<":
+            upstreamids.append(id)
+    return find_candidates(repo, localids, upstreamids, threshold)
+
+
+def suggest():
+    """List likely origins for the local commits without origins, by the similarity of their changes."""
+
+    args = argv[1:]
+    threshold = 0.5
+    if "-t" in args:
+        i = args.index("-t")
+        try:
+            threshold = float(args[i + 1])
+        except (IndexError, ValueError):
+            print >>stderr, suggest_usage
+            exit(2)
+        del args[i:i + 2]
+
+    repo = Repo(commit_cache_size=commit_cache_size)
+    if len(args) > 0:
+        upstream = args[0]
+    else:
+        upstream = _tracked_upstream(repo)
 
-        for c in commits:
-            if c.direction == "-":
-                print("%s %s" % (c.direction, c))
-            elif c.direction == ">":
-                print("+ %s" % c)
+    if len(args) > 1:
+        local = args[1]
+    else:
+        local = "HEAD"
+
+    try:
+        for (score, commit, origin) in suggest_origins(repo, upstream, local, threshold, *args[2:]):
+            print("%.2f %s %s" % (score, commit, origin))
     except GitCommandError, exc:
-        exit("Failed to display commits when executing %s:\n%s" % (exc.command, exc.stderr))
+        exit("Failed to suggest origins when executing %s:\n%s" % (exc.command, exc.stderr))
+
+
+def _iter_blob_history(repo, ref, path, *args):
+    """Yield (commit id, parent ids, blob id) for the commits of ``ref``
+    which changed ``path``, newest first, from a single streamed git log
+    --raw.  The parents are those of the history simplified to ``path``.
+    The blob id is None for a commit which deleted ``path``, and for a merge
+    which kept the blob of one of its parents, as those have no raw
+    output."""
+    args = args + (ref, "--", path)
+    log = repo.git.log(raw=True, no_abbrev=True, c=True, no_renames=True,
+                       parents=True, format="%H %P", as_process=True, *args)
+    entry = None
+    for line in log.stdout:
+        line = line.rstrip("\n")
+        if not line:
+            continue
+        if line.startswith(":"):
+            # The last id is the blob of the commit, in the raw output of
+            # both commits and merges
+            blob = line.split("\t", 1)[0].split()[-2]
+            entry[2] = blob.strip("0") and blob or None
+        else:
+            if entry is not None:
+                yield tuple(entry)
+            ids = line.split()
+            entry = [ids[0], ids[1:], None]
+    if entry is not None:
+        yield tuple(entry)
+    log.wait()
+
+def file_origins(repo, fn, upstream, local):
+    """Classify the commits of ``upstream`` and ``local`` which changed the
+    file ``fn``, as ``classify`` does, and mark "-" the upstream commits
+    up to the newest one which holds the initial blob of ``fn`` in
+    ``local``.
+
+    Returns
+        list of (direction, commit id), oldest first, or None if ``fn`` has
+        no history in ``local``
+    """
+    upstream, local = repo.rev_parse_many([upstream, local])
+
+    initialblob = None
+    for (id, parents, blob) in _iter_blob_history(repo, local, fn, "--reverse"):
+        if blob is not None:
+            initialblob = blob
+            break
+    if initialblob is None:
+        return None
+
+    # The newest upstream commit with each blob, up to the newest deletion
+    # of the file
+    blobs = {}
+    parents = {}
+    deleted = False
+    for (id, ids, blob) in _iter_blob_history(repo, upstream, fn):
+        parents[id] = ids
+        if deleted:
+            continue
+        if blob is None and not ids[1:]:
+            deleted = True
+        elif blob is not None:
+            blobs.setdefault(blob, id)
+    ustart = blobs.get(initialblob)
 
-def _traverse(tree, path):
-    parts = path.split(sep)
-    while parts:
-        piece = parts.pop(0)
-        obj = tree[piece]
-        if hasattr(obj, "mime_type"):
-            yield obj
+    upstream_precommits = set()
+    if ustart:
+        pending = [ustart]
+        while pending:
+            id = pending.pop()
+            if id not in upstream_precommits:
+                upstream_precommits.add(id)
+                pending.extend(parents.get(id, ()))
+    else:
+        print >>stderr, "Warning: upstream does not have the initial blob for %s." % fn
 
-        tree = obj
+    commits = reversed(classify(repo, upstream, local, "--", fn))
+    return [(id in upstream_precommits and "-" or direction, id)
+            for (direction, id) in commits]
 
 def file():
     """For a given file, compare its history against UPSTREAM."""
 
-    repo = Repo()
+    repo = Repo(commit_cache_size=commit_cache_size)
     fn = argv[1]
     upstream = argv[2]
     try:
@@ -363,38 +1404,16 @@ def file():
     except IndexError:
         local = "HEAD"
 
-    lstart = Commit.find_all(repo, local, fn)[-1]
-    initialblob = _traverse(lstart.tree, fn).next()
-    def _commit_for_blob(ref, fn):
-        upstream = Commit.find_all(repo, ref, fn)
-        for commit in upstream:
-            try:
-                blob = _traverse(commit.tree, fn).next()
-            except KeyError:
-                return
-
-            if blob.id == initialblob.id:
-                return commit
-
-    ustart = _commit_for_blob(upstream, fn)
-    if ustart:
-        upstream_precommits = set(c.id for c in Commit.find_all(repo, ustart, fn))
-    else:
-        print >>stderr, "Warning: upstream does not have the initial blob for %s." % fn
-
-    upstream, local = (_commit(repo, upstream), _commit(repo, local))
-    commits = reversed(left_right(repo, upstream, local, fn))
-    for commit in commits:
-        if ustart:
-            if commit.direction != "-" and \
-               commit.id in upstream_precommits:
-                commit.direction = "-"
-        print("%s %s" % (commit.direction, commit))
+    commits = file_origins(repo, fn, upstream, local)
+    if commits is None:
+        exit("%s has no history in %s." % (fn, local))
+    for (direction, id) in commits:
+        print("%s %s" % (direction, id))
 
 
 def pull():
     remote = argv[1]
-    repo = Repo()
+    repo = Repo(commit_cache_size=commit_cache_size)
     origins = Origins(repo)
     try:
         origins.pull(remote)
@@ -403,7 +1422,7 @@ def pull():
 
 def push():
     remote = argv[1]
-    repo = Repo()
+    repo = Repo(commit_cache_size=commit_cache_size)
     origins = Origins(repo)
     try:
         origins.push(remote)
@@ -411,24 +1430,29 @@ def push():
         exit("Unable to push when executing %s:\n%s" % (exc.command, exc.stderr))
 
 def merge():
-    repo = Repo()
+    repo = Repo(commit_cache_size=commit_cache_size)
     fn = argv[4]
-    base = Blob(repo, argv[1], name=fn)
-    left = Blob(repo, argv[2], name=fn)
-    right = Blob(repo, argv[3], name=fn)
 
-    origins = set(left.data.splitlines())
-    base_origins = set(base.data.splitlines())
-    right_origins = set(right.data.splitlines())
+    def _ids(blobid):
+        # merge-index passes an empty id for a side which lacks the file
+        if not blobid:
+            return []
+        return Blob(repo, blobid, name=fn).data.splitlines()
+
+    base_origins = set(_ids(argv[1]))
+    origins = _ids(argv[2])
+    right_origins = _ids(argv[3])
 
     removed = base_origins.difference(right_origins)
-    for rem in removed:
-        if rem in origins:
-            origins.remove(rem)
+    origins = [o for o in origins if o not in removed]
 
-    added = right_origins.difference(base_origins)
-    for add in added:
-        if not add in origins:
-            origins.add(add)
+    for add in right_origins:
+        if not add in base_origins and not add in origins:
+            origins.append(add)
 
-    open(fn, "w").write(linesep.join(leftorigins))
+    if _is_blacklist(note_name(fn)):
+        # Blacklist shards are kept sorted
+        origins.sort()
+        open(fn, "w").write("".join("%s\n" % o for o in origins))
+    else:
+        open(fn, "w").write("\n".join(origins))
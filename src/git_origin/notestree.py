@@ -0,0 +1,178 @@
+"""Reading and writing of the origins notes tree.
+
+Notes are blobs named by the SHA1 of the commit they annotate.  Like
+git's own notes, they may be stored flat at the root of the tree, or
+fanned out into subtrees named by the first two hex digits of the SHA1
+("ab/cdef...").  Both layouts, and trees mixing them, are read the same
+way.  Once the tree holds ``fanout_threshold`` notes, it is migrated to
+the fanout layout, so that an update only rewrites the small subtrees it
+touches and the root.
+"""
+
+import re
+from shutil import rmtree
+from tempfile import mkdtemp
+from os.path import join
+
+
+fanout_threshold = 256
+_sha_re = re.compile(r"^[0-9a-f]{40}$")
+_fanout_re = re.compile(r"^[0-9a-f]{2}$")
+
+
+def note_name(path):
+    """The name of the note stored at ``path``, whatever its fanout."""
+    name = path.replace("/", "")
+    if _sha_re.match(name):
+        return name
+    return path
+
+
+def hash_blobs(repo, datas):
+    """Write blobs with a single git hash-object call.
+
+    Returns
+        dict of each of the given strings to the SHA1 of its blob"""
+    datas = list(set(datas))
+    if not datas:
+        return {}
+
+    tmpdir = mkdtemp(prefix="git-origin.")
+    try:
+        files = []
+        for i, data in enumerate(datas):
+            fn = join(tmpdir, str(i))
+            open(fn, "wb").write(data)
+            files.append(fn)
+
+        output = repo.git.hash_object(w=True, stdin_paths=True, no_filters=True,
+                                      input="\n".join(files) + "\n")
+    finally:
+        rmtree(tmpdir)
+    return dict(zip(datas, output.split()))
+
+
+def _ls_tree(repo, *args):
+    for line in repo.git.ls_tree(*args).splitlines():
+        info, path = line.split("\t", 1)
+        (mode, type, sha) = info.split()
+        yield (path, mode, type, sha)
+
+
+def _insert(tree, path, entry):
+    parts = path.split("/")
+    for part in parts[:-1]:
+        subtree = tree.get(part)
+        if not isinstance(subtree, dict):
+            subtree = tree[part] = {}
+        tree = subtree
+    tree[parts[-1]] = entry
+
+
+def _remove(tree, path):
+    parts = path.split("/")
+    trees = []
+    for part in parts[:-1]:
+        trees.append((tree, part))
+        tree = tree.get(part)
+        if not isinstance(tree, dict):
+            return
+    tree.pop(parts[-1], None)
+
+    # Drop the subtrees left empty
+    for (parent, part) in reversed(trees):
+        if parent[part]:
+            break
+        del parent[part]
+
+
+def _make_trees(repo, tree):
+    """Write a tree given as a dict of name to either a (mode, type, sha)
+    tuple or a dict for a subtree to write, with a single git mktree
+    process.  Returns the SHA1 of the tree."""
+    mktree = repo.git.mktree(batch=True, as_process=True)
+
+    def _make(tree):
+        lines = []
+        for (name, entry) in sorted(tree.iteritems()):
+            if isinstance(entry, dict):
+                entry = ("040000", "tree", _make(entry))
+            lines.append("%s %s %s\t%s\n" % (entry + (name,)))
+        mktree.stdin.write("".join(lines) + "\n")
+        mktree.stdin.flush()
+        return mktree.stdout.readline().strip()
+
+    try:
+        return _make(tree)
+    finally:
+        mktree.stdin.close()
+        mktree.wait()
+
+
+def write_notes_tree(repo, tip, changes, count=0):
+    """Write the notes tree of ``tip`` with the given changes.
+
+    ``tip``
+        is the SHA1 of the current notes commit, or None
+
+    ``changes``
+        is a dict of note name (or path, for the notes which aren't named
+        by a commit) to the SHA1 of its new blob, or None to remove the
+        note
+
+    ``count``
+        is the number of notes in the tree, used to decide whether to
+        switch to the fanout layout
+
+    Returns
+        the SHA1 of the new tree
+    """
+    root = {}
+    if tip is not None:
+        for (path, mode, type, sha) in _ls_tree(repo, tip):
+            root[path] = (mode, type, sha)
+
+    fanned = [name for (name, entry) in root.iteritems()
+              if entry[1] == "tree" and _fanout_re.match(name)]
+    fanout = fanned or count >= fanout_threshold
+
+    changes = dict(changes)
+    if fanout and not fanned:
+        # Migrate the flat notes, along with this update
+        for (name, entry) in root.items():
+            if entry[1] == "blob" and _sha_re.match(name):
+                changes.setdefault(name, entry[2])
+
+    # Expand the subtrees which are changed
+    paths = {}
+    prefixes = set()
+    for name in changes:
+        if _sha_re.match(name):
+            prefixes.add(name[:2])
+        elif "/" in name:
+            prefixes.add(name.split("/", 1)[0])
+    existing = [prefix for prefix in prefixes
+                if prefix in root and root[prefix][1] == "tree"]
+    if existing:
+        for (path, mode, type, sha) in _ls_tree(repo, "-r", tip, "--", *existing):
+            _insert(root, path, (mode, type, sha))
+            paths.setdefault(note_name(path), []).append(path)
+
+    # Removals first, so that a removed blob doesn't take away a new
+    # subtree of the same name
+    for (name, sha) in sorted(changes.iteritems(), key=lambda c: c[1] is not None):
+        if "/" in name:
+            _remove(root, name)
+        else:
+            root.pop(name, None)
+        for path in paths.get(name, ()):
+            _remove(root, path)
+
+        if sha is not None:
+            if fanout and _sha_re.match(name):
+                path = "%s/%s" % (name[:2], name[2:])
+            else:
+                path = name
+            _insert(root, path, ("100644", "blob", sha))
+
+    return _make_trees(repo, root)
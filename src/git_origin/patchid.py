@@ -0,0 +1,106 @@
+"""Patch-ids of commits, kept in a persistent cache.
+
+Commits are immutable, so the patch-id of a commit never changes.  The
+cache is a side file in the git directory made of fixed size records: the
+binary commit SHA1 followed by its binary patch-id.  It is only ever
+appended to, with the patch-ids of the commits it hasn't seen yet.
+"""
+
+import os
+from sys import stderr
+from tempfile import TemporaryFile
+from binascii import hexlify, unhexlify
+from os.path import join
+
+
+cache_filename = "origins-patch-ids"
+_record_size = 40
+# Recorded for the commits which have no patch-id (e.g. empty commits), so
+# that they aren't diffed again
+_no_patch_id = "0" * 40
+
+
+def diff_commits(repo, commits):
+    """Start a single git diff-tree -p over the given commit ids.  Its
+    output has a line with the commit id before the diff of each commit.
+
+    Returns
+        the running git.cmd.AutoInterrupt process"""
+    input = TemporaryFile()
+    try:
+        input.write("".join("%s\n" % c for c in commits))
+        input.seek(0)
+        return repo.git.diff_tree(stdin=True, p=True, root=True, no_color=True,
+                                  no_ext_diff=True, istream=input, as_process=True)
+    finally:
+        input.close()
+
+
+def compute_patch_ids(repo, commits):
+    """Yield (commit id, patch id) for the given commits, from a single
+    git diff-tree -p piped into git patch-id --stable.  Commits without
+    changes don't yield anything."""
+    diff = diff_commits(repo, commits)
+    patchid = repo.git.patch_id(stable=True, istream=diff.stdout, as_process=True)
+    diff.stdout.close()
+
+    for line in patchid.stdout:
+        (pid, commit) = line.split()
+        yield (commit, pid)
+    patchid.wait()
+    diff.wait()
+
+
+class PatchIdCache(object):
+    """Persistent map of commit id to patch-id."""
+
+    def __init__(self, repo, path=None):
+        if path is None:
+            path = join(repo.path, cache_filename)
+        self.repo = repo
+        self.path = path
+        self.ids = {}
+        self._read()
+
+    def _read(self):
+        try:
+            data = open(self.path, "rb").read()
+        except IOError:
+            return
+
+        for pos in xrange(0, len(data) - _record_size + 1, _record_size):
+            self.ids[hexlify(data[pos:pos + 20])] = hexlify(data[pos + 20:pos + _record_size])
+
+    def _append(self, pairs):
+        f = open(self.path, "ab")
+        try:
+            # Drop a partial record left behind by an interrupted append
+            size = os.fstat(f.fileno()).st_size
+            if size % _record_size:
+                f.truncate(size - size % _record_size)
+            f.write("".join(unhexlify(commit) + unhexlify(pid) for (commit, pid) in pairs))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+
+    def patch_ids(self, commits):
+        """The patch-ids of the given commit ids, computing and recording
+        only those which aren't in the cache yet.
+
+        Returns
+            dict of commit id to patch-id, without the commits which have
+            no patch-id"""
+        commits = list(commits)
+        missing = [c for c in commits if c not in self.ids]
+        if missing:
+            computed = dict(compute_patch_ids(self.repo, missing))
+            pairs = [(c, computed.get(c, _no_patch_id)) for c in missing]
+            self.ids.update(pairs)
+            try:
+                self._append(pairs)
+            except (IOError, OSError), exc:
+                print >>stderr, "Warning: unable to write %s: %s" % (self.path, exc)
+
+        return dict((c, self.ids[c]) for c in commits
+                    if self.ids[c] != _no_patch_id)
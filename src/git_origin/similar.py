@@ -0,0 +1,136 @@
+"""Find likely origins of cherry picks whose patch had to change.
+
+Each commit is reduced to the set of its normalized changed lines.  A
+MinHash signature of that set estimates how similar two commits are, and
+locality sensitive hashing over bands of the signatures proposes the
+candidate pairs, so the local commits aren't compared to every upstream
+commit.
+"""
+
+import re
+from random import Random
+from zlib import crc32
+from git_origin.patchid import diff_commits
+
+
+# Larger than any 32 bit hash
+_prime = 4294967311
+_ws_re = re.compile(r"\s+")
+_sha_re = re.compile(r"^[0-9a-f]{40}$")
+
+
+class MinHasher(object):
+    """MinHash signatures of ``permutations`` values, split into ``bands``
+    bands for locality sensitive hashing.
+
+    Two sets of similarity s share at least one band with a probability of
+    1 - (1 - s^rows)^bands, which with the defaults is above 0.5 from a
+    similarity of about 0.5."""
+
+    def __init__(self, permutations=64, bands=16, seed=0):
+        if permutations % bands:
+            raise ValueError("%d permutations can't be split into %d bands" % (permutations, bands))
+
+        random = Random(seed)
+        self.coefficients = [(random.randint(1, _prime - 1), random.randint(0, _prime - 1))
+                             for i in xrange(permutations)]
+        self.bands = bands
+        self.rows = permutations // bands
+
+    def signature(self, shingles):
+        """The signature of a set of strings, or None for an empty set."""
+        hashes = [crc32(s) & 0xffffffff for s in shingles]
+        if not hashes:
+            return
+        return tuple(min((a * h + b) % _prime for h in hashes)
+                     for (a, b) in self.coefficients)
+
+    def band_keys(self, signature):
+        rows = self.rows
+        return [(i, signature[i * rows:(i + 1) * rows]) for i in xrange(self.bands)]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the sets of two signatures."""
+    same = sum(1 for (a, b) in zip(signature, other) if a == b)
+    return float(same) / len(signature)
+
+
+def iter_shingles(repo, commits):
+    """Yield (commit id, set of normalized changed lines) for the given
+    commits, from a single diff-tree.  Lines are stripped of their
+    whitespace and keep their +/- sign, so that context changes and
+    reindentation don't count."""
+    commits = list(commits)
+    if not commits:
+        return
+
+    diff = diff_commits(repo, commits)
+    commit, shingles, in_hunk = None, None, False
+    for line in diff.stdout:
+        line = line.rstrip("\n")
+        if _sha_re.match(line):
+            if commit is not None:
+                yield (commit, shingles)
+            commit, shingles, in_hunk = line, set(), False
+        elif line.startswith("diff "):
+            in_hunk = False
+        elif line.startswith("@@"):
+            in_hunk = True
+        elif in_hunk and line[:1] in ("+", "-"):
+            normalized = _ws_re.sub("", line[1:])
+            if normalized:
+                shingles.add(line[0] + normalized)
+    if commit is not None:
+        yield (commit, shingles)
+    diff.wait()
+
+
+def find_candidates(repo, local, upstream, threshold=0.5, hasher=None):
+    """Propose upstream origins for local commits by the similarity of
+    their changes.
+
+    ``local``
+        is a list of ids of the commits which need origins
+
+    ``upstream``
+        is a list of ids of the commits which may be origins
+
+    ``threshold``
+        is the minimum estimated similarity, from 0 to 1, of a candidate
+
+    Returns
+        list of (similarity, local commit id, upstream commit id), the most
+        similar first
+    """
+    if hasher is None:
+        hasher = MinHasher()
+
+    signatures = {}
+    buckets = {}
+    for (commit, shingles) in iter_shingles(repo, upstream):
+        signature = hasher.signature(shingles)
+        if signature is not None:
+            signatures[commit] = signature
+            for key in hasher.band_keys(signature):
+                buckets.setdefault(key, []).append(commit)
+
+    candidates = []
+    for (commit, shingles) in iter_shingles(repo, local):
+        signature = hasher.signature(shingles)
+        if signature is None:
+            continue
+
+        seen = set()
+        for key in hasher.band_keys(signature):
+            for other in buckets.get(key, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+
+                score = similarity(signature, signatures[other])
+                if score >= threshold:
+                    candidates.append((score, commit, other))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    return candidates
@@ -0,0 +1,70 @@
+"""Scratch repositories for the tests."""
+
+import os
+import shutil
+from tempfile import mkdtemp
+from subprocess import Popen, PIPE
+from git.repo import Repo
+from git_origin.cmd import OriginsIndex, notes_ref
+
+
+class ScratchRepo(object):
+    """A git repository in a temporary directory, driven with the git
+    command line."""
+
+    def __init__(self):
+        self.path = mkdtemp(prefix="git-origin-test.")
+        self.env = dict(os.environ)
+        self.env.pop("GIT_NOTES_REF", None)
+        self.time = 1300000000
+        self.git("init", "-q")
+        self.git("config", "user.name", "Test")
+        self.git("config", "user.email", "test@example.com")
+        self.git("symbolic-ref", "HEAD", "refs/heads/master")
+        self.commit("base")
+
+    def cleanup(self):
+        shutil.rmtree(self.path)
+
+    def git(self, *args, **kwargs):
+        # Each command is a second later, so that the commits are ordered
+        # by date as they are in real histories
+        self.time += 1
+        for name in ("GIT_AUTHOR_DATE", "GIT_COMMITTER_DATE"):
+            self.env[name] = "%d +0000" % self.time
+        proc = Popen(("git",) + args, cwd=self.path, env=self.env,
+                     stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        (out, err) = proc.communicate(kwargs.get("input"))
+        if proc.returncode != 0:
+            raise AssertionError("git %s failed: %s" % (" ".join(args), err))
+        return out.strip()
+
+    def commit(self, name, content=None, message=None):
+        """Commit a change to the file ``name``, returning the commit id."""
+        f = open(os.path.join(self.path, name), "a")
+        f.write("%s\n" % (content or name))
+        f.close()
+        self.git("add", name)
+        self.git("commit", "-q", "-m", message or name)
+        return self.git("rev-parse", "HEAD")
+
+    def branch(self, name, start="master"):
+        self.git("checkout", "-q", "-b", name, start)
+
+    def note(self, commit, *origins):
+        self.git("notes", "--ref", notes_ref, "add", "-f", "--allow-empty",
+                 "-F", "-", commit, input="".join("%s\n" % o for o in origins))
+
+    def repo(self, cold=False):
+        """A Repo as a new process would see it.  If ``cold`` is set, the
+        caches kept in the git directory are dropped too."""
+        OriginsIndex._loaded.clear()
+        if cold:
+            for name in os.listdir(os.path.join(self.path, ".git")):
+                if name.startswith("origins-"):
+                    path = os.path.join(self.path, ".git", name)
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.unlink(path)
+        return Repo(self.path, commit_cache_size=1000)
@@ -0,0 +1,72 @@
+from nose.tools import *
+from git_origin.cmd import Origins, OriginsIndex, notes_ref
+from test.helper import ScratchRepo
+
+
+class TestOriginsBatch(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        self.commits = [s.commit("file%d" % i) for i in range(6)]
+        s.note(self.commits[0], self.commits[5])
+        s.note(self.commits[1], self.commits[5])
+        self.tip = s.git("rev-parse", notes_ref)
+
+    def teardown(self):
+        self.scratch.cleanup()
+
+    def notes_commits(self):
+        return self.scratch.git("rev-list", notes_ref).split()
+
+    def test_changes_are_committed_once(self):
+        c = self.commits
+        origins = Origins(self.scratch.repo())
+        with origins.batch() as batch:
+            batch[c[2]] = [c[5]]
+            batch[c[3]] = [c[4], c[5]]
+            del batch[c[0]]
+            batch.blacklist(c[1])
+            batch.blacklist(c[4])
+            batch.unblacklist(c[4])
+
+        commits = self.notes_commits()
+        assert_equal(3, len(commits))
+        assert_equal(self.tip, self.scratch.git("rev-parse", notes_ref + "^"))
+        assert_equal("Update origins for 4 commits",
+                     self.scratch.git("log", "-1", "--format=%s", notes_ref))
+
+        notes = OriginsIndex.load(self.scratch.repo(cold=True))
+        assert_equal({c[1]: [c[5]], c[2]: [c[5]], c[3]: [c[4], c[5]]},
+                     dict(notes.origins.iteritems()))
+        assert_equal([c[1]], notes.blacklist)
+
+    def test_nothing_is_committed_on_errors(self):
+        c = self.commits
+        origins = Origins(self.scratch.repo())
+        try:
+            with origins.batch() as batch:
+                batch[c[2]] = [c[5]]
+                del batch[c[0]]
+                batch.blacklist(c[1])
+                raise KeyError(c[3])
+        except KeyError:
+            pass
+        else:
+            assert False, "the exception was swallowed"
+
+        assert_equal(self.tip, self.scratch.git("rev-parse", notes_ref))
+        notes = OriginsIndex.load(self.scratch.repo())
+        assert_equal({c[0]: [c[5]], c[1]: [c[5]]}, dict(notes.origins.iteritems()))
+        assert_equal([], notes.blacklist)
+
+    def test_no_changes_make_no_commit(self):
+        c = self.commits
+        origins = Origins(self.scratch.repo())
+        with origins.batch() as batch:
+            batch[c[2]] = [c[5]]
+        tip = self.scratch.git("rev-parse", notes_ref)
+
+        with origins.batch() as batch:
+            batch[c[2]] = [c[5]]
+            batch.unblacklist(c[1])
+        assert_equal(tip, self.scratch.git("rev-parse", notes_ref))
@@ -0,0 +1,113 @@
+import os
+from tempfile import mkdtemp
+from shutil import rmtree
+from nose.tools import *
+from git_origin import cache
+from git_origin.cmd import classify, cached_classify
+from test.helper import ScratchRepo
+
+A = "a" * 40
+B = "b" * 40
+C = "c" * 40
+D = "d" * 40
+E = "e" * 40
+
+
+class TestCacheFile(object):
+    def setup(self):
+        self.dir = mkdtemp()
+        self.path = os.path.join(self.dir, "origins-cache")
+
+    def teardown(self):
+        rmtree(self.dir)
+
+    def test_round_trip(self):
+        cache.write(self.path, A, {A: [B, C], B: []}, [D])
+        (tip, forward, reverse, blacklist, extra) = cache.read(self.path)
+
+        assert_equal(A, tip)
+        assert_equal([B, C], forward[A])
+        assert_equal([A], reverse[B])
+        assert_equal([D], blacklist)
+        assert_equal({B: []}, extra)
+
+    def test_round_trip_of_ids_which_are_not_full(self):
+        cache.write(self.path, A, {A: [B, "abc1234"], C: ["1234567"]}, [D, "def5678"])
+        (tip, forward, reverse, blacklist, extra) = cache.read(self.path)
+
+        assert_equal([B], forward[A])
+        assert_equal({A: ["abc1234"], C: ["1234567"]}, extra)
+        assert_equal([D, "def5678"], blacklist)
+
+    def test_other_version_is_ignored(self):
+        cache.write(self.path, A, {A: [B]}, [])
+        data = open(self.path, "rb").read()
+        open(self.path, "wb").write(data[:4] + "\0\0\0\1" + data[8:])
+        assert_equal(None, cache.read(self.path))
+
+
+class TestCachedNotes(object):
+    """The origins cache must give the same answers as the notes it was
+    made from, whatever commits existed when it was written."""
+
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        s.branch("upstream")
+        self.up = [s.commit("up1"), s.commit("up2"), s.commit("up3")]
+        s.branch("local", "master")
+        self.picked = s.commit("up2", "picked")
+        self.unfetched = s.commit("local1")
+        self.abbreviated = s.commit("local2")
+        self.empty = s.commit("local3")
+        self.unresolved = s.commit("local4")
+
+        # A commit which only exists in another repository, for now
+        self.other = ScratchRepo()
+        self.missing = self.other.commit("elsewhere")
+
+        s.note(self.picked, self.up[1])
+        s.note(self.unfetched, self.missing)
+        s.note(self.abbreviated, self.up[2][:10])
+        s.note(self.empty)
+        s.note(self.unresolved, self.missing[:12])
+
+    def teardown(self):
+        self.scratch.cleanup()
+        self.other.cleanup()
+
+    def classify(self, cold):
+        return classify(self.scratch.repo(cold), "upstream", "local")
+
+    def test_cold_and_warm_loads_agree(self):
+        cold = self.classify(cold=True)
+        warm = self.classify(cold=False)
+        assert_equal(cold, warm)
+
+        directions = dict((id, d) for (d, id) in cold)
+        assert_equal("-", directions[self.picked])
+        assert_equal("-", directions[self.up[1]])
+        # Full SHA1s count whether or not they were fetched, as with
+        # rev-parse --verify
+        assert_equal(">", directions[self.unfetched])
+        assert_equal("-", directions[self.abbreviated])
+        assert_equal("-", directions[self.up[2]])
+        # The other ids only count if they resolve: none of them, so all
+        # are in range
+        assert_equal("-", directions[self.unresolved])
+        assert_equal("-", directions[self.empty])
+        assert_equal("<", directions[self.up[0]])
+
+    def test_origins_are_checked_again_once_fetched(self):
+        self.classify(cold=True)
+        before = cached_classify(self.scratch.repo(), "upstream", "local")
+        assert_true(("-", self.unresolved) in before)
+
+        self.scratch.git("fetch", "-q", self.other.path, "master:refs/heads/other")
+        cached = cached_classify(self.scratch.repo(), "upstream", "local")
+        warm = self.classify(cold=False)
+        cold = self.classify(cold=True)
+        assert_equal(cold, warm)
+        assert_equal(cold, cached)
+        assert_true((">", self.unfetched) in cold)
+        assert_true((">", self.unresolved) in cold)
@@ -0,0 +1,86 @@
+from nose.tools import *
+from git_origin import cmd
+from git_origin.cmd import cached_classify, classify
+from test.helper import ScratchRepo
+
+
+class TestCachedClassify(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        s.branch("upstream")
+        self.up = [s.commit("up%d" % i) for i in range(3)]
+        s.branch("local", "master")
+        self.local = [s.commit("local%d" % i) for i in range(3)]
+        s.note(self.local[0], self.up[0])
+
+        # Record the rev-list walks of the classifications
+        self.walks = []
+        self.rev_left_right = cmd._rev_left_right
+        def _rev_left_right(repo, *args):
+            self.walks.append(args)
+            return self.rev_left_right(repo, *args)
+        cmd._rev_left_right = _rev_left_right
+
+    def teardown(self):
+        cmd._rev_left_right = self.rev_left_right
+        self.scratch.cleanup()
+
+    def check(self, *args):
+        """Check cached_classify against classify, returning the walks it
+        made."""
+        expected = classify(self.scratch.repo(), "upstream", "local", *args)
+        del self.walks[:]
+        assert_equal(expected, cached_classify(self.scratch.repo(), "upstream", "local", *args))
+        walks = list(self.walks)
+        assert_equal(expected, cached_classify(self.scratch.repo(), "upstream", "local", *args))
+        assert_equal(walks, self.walks)
+        return walks
+
+    def is_full(self, walks):
+        assert_equal(1, len(walks))
+        return "--not" not in walks[0]
+
+    def commit(self, branch, name):
+        self.scratch.git("checkout", "-q", branch)
+        return self.scratch.commit(name)
+
+    def test_unchanged(self):
+        for args in ((), ("--reverse",)):
+            assert self.is_full(self.check(*args))
+            assert_equal([], self.check(*args))
+
+    def test_branches_moved_forward(self):
+        for args in ((), ("--reverse",)):
+            self.check(*args)
+        up = self.commit("upstream", "up3")
+        local = self.commit("local", "local3")
+        self.scratch.note(local, up)
+        self.commit("local", "local4")
+        for args in ((), ("--reverse",)):
+            assert not self.is_full(self.check(*args))
+
+    def test_only_notes_moved(self):
+        self.check()
+        self.scratch.note(self.local[1], self.up[1])
+        self.scratch.note(self.up[2], self.local[2])
+        assert_equal([], self.check())
+
+        self.scratch.git("notes", "--ref", cmd.notes_ref, "remove", self.local[0])
+        assert_equal([], self.check())
+
+    def test_rewind(self):
+        self.check()
+        self.scratch.git("branch", "-f", "upstream", self.up[1])
+        self.scratch.git("checkout", "-q", "local")
+        self.scratch.git("reset", "-q", "--hard", self.local[1])
+        self.commit("local", "local3")
+        assert self.is_full(self.check())
+
+    def test_merge(self):
+        self.check()
+        self.scratch.git("checkout", "-q", "local")
+        self.scratch.git("merge", "-q", "--no-edit", "upstream")
+        up = self.commit("upstream", "up3")
+        self.scratch.note(self.commit("local", "local3"), up)
+        assert self.is_full(self.check())
@@ -0,0 +1,108 @@
+from nose.tools import *
+from git_origin.cmd import classify, update_blacklist, notes_ref
+from test.helper import ScratchRepo
+
+
+def reference_classify(scratch, left, right):
+    """The classification of the original left_right, with every origin
+    resolved by git rev-parse --verify, and its all() check fixed."""
+    def rev_parse(id):
+        try:
+            return scratch.git("rev-parse", "--verify", id)
+        except AssertionError:
+            return None
+
+    def note(path):
+        try:
+            return scratch.git("show", "%s:%s" % (notes_ref, path))
+        except AssertionError:
+            return None
+
+    commits = [(line[0], line[1:]) for line in
+               scratch.git("rev-list", "--left-right", "%s...%s" % (left, right)).split()]
+    ids = set(id for (direction, id) in commits)
+    directions = dict((id, direction) for (direction, id) in commits)
+
+    blacklist = set()
+    for path in scratch.git("ls-tree", "-r", "--name-only", notes_ref, "--", "blacklist").split():
+        blacklist.update(rev_parse(id) for id in note(path).split())
+
+    for (direction, id) in commits:
+        data = note(id)
+        if id in blacklist:
+            directions[id] = "-"
+        elif data is not None:
+            origins = [o for o in (rev_parse(line) for line in data.splitlines()) if o]
+            for o in origins:
+                if o in ids:
+                    directions[o] = "-"
+            if all(o in ids for o in origins):
+                directions[id] = "-"
+
+    return [(directions[id], id) for (direction, id) in commits]
+
+
+class TestClassify(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        self.base = s.git("rev-parse", "HEAD")
+        s.branch("upstream")
+        self.up = [s.commit("up%d" % i) for i in range(6)]
+        s.branch("local", "master")
+        self.local = [s.commit("local%d" % i) for i in range(8)]
+
+    def teardown(self):
+        self.scratch.cleanup()
+
+    def check(self):
+        s = self.scratch
+        expected = reference_classify(s, "upstream", "local")
+        assert_equal(expected, classify(s.repo(cold=True), "upstream", "local"))
+        assert_equal(expected, classify(s.repo(), "upstream", "local"))
+        return dict((id, direction) for (direction, id) in expected)
+
+    def test_origins_in_range(self):
+        self.scratch.note(self.local[0], self.up[0])
+        directions = self.check()
+        assert_equal("-", directions[self.local[0]])
+        assert_equal("-", directions[self.up[0]])
+
+    def test_blacklisted_commits(self):
+        self.scratch.note(self.local[1], self.up[1])
+        update_blacklist(self.scratch.repo(), [self.local[1], self.up[2], self.local[2]])
+        directions = self.check()
+        assert_equal("-", directions[self.local[1]])
+        assert_equal("-", directions[self.up[2]])
+        # The origin of a blacklisted commit isn't marked through it
+        assert_equal("<", directions[self.up[1]])
+
+    def test_origins_outside_of_the_range(self):
+        self.scratch.note(self.local[0], self.base)
+        self.scratch.note(self.local[1], self.base, self.up[0])
+        directions = self.check()
+        assert_equal(">", directions[self.local[0]])
+        assert_equal(">", directions[self.local[1]])
+        assert_equal("-", directions[self.up[0]])
+
+    def test_notes_without_valid_origins(self):
+        # A full SHA1 which wasn't fetched is a valid origin, outside of
+        # the range
+        self.scratch.note(self.local[0], "0123456789" * 4)
+        self.scratch.note(self.local[1], "deadbeef", "not-a-commit")
+        self.scratch.note(self.local[2])
+        directions = self.check()
+        assert_equal(">", directions[self.local[0]])
+        assert_equal("-", directions[self.local[1]])
+        assert_equal("-", directions[self.local[2]])
+
+    def test_origins_on_both_sides(self):
+        self.scratch.note(self.local[3], self.up[3], self.local[4])
+        self.scratch.note(self.up[4], self.local[5])
+        self.scratch.note(self.local[6], self.up[5][:12], "0123456789" * 4)
+        directions = self.check()
+        for id in (self.local[3], self.up[3], self.local[4], self.up[4], self.local[5],
+                   self.up[5]):
+            assert_equal("-", directions[id])
+        assert_equal(">", directions[self.local[6]])
+        assert_equal(">", directions[self.local[7]])
@@ -0,0 +1,45 @@
+import os
+from nose.tools import *
+from git_origin.cmd import derived_commits, update_blacklist, cache_filename
+from test.helper import ScratchRepo
+
+
+class TestDerivedCommits(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        s.branch("upstream")
+        self.up = [s.commit("up%d" % i) for i in range(2)]
+        s.branch("local", "master")
+        self.local = [s.commit("local%d" % i) for i in range(5)]
+
+        s.note(self.local[0], self.up[0])
+        s.note(self.local[1], self.up[1], self.up[0])
+        s.note(self.local[2], self.up[0][:10])
+        s.note(self.local[3], self.up[0])
+        s.note(self.local[4], self.up[1])
+        update_blacklist(s.repo(), [self.local[3]])
+
+    def teardown(self):
+        self.scratch.cleanup()
+
+    def derived(self, origin, cold=False):
+        return sorted(derived_commits(self.scratch.repo(cold), origin))
+
+    def test_derived_commits(self):
+        expected = sorted(self.local[:3])
+        assert_equal(expected, self.derived(self.up[0], cold=True))
+        assert_true(os.path.exists(os.path.join(self.scratch.path, ".git", cache_filename)))
+        # From the on-disk index, by any commit-ish
+        assert_equal(expected, self.derived(self.up[0]))
+        assert_equal(expected, self.derived("upstream~1"))
+        assert_equal(sorted([self.local[1], self.local[4]]), self.derived(self.up[1]))
+        assert_equal([], self.derived(self.local[0]))
+
+    def test_follows_the_notes(self):
+        self.derived(self.up[0], cold=True)
+        self.scratch.note(self.local[0], self.up[1])
+        update_blacklist(self.scratch.repo(), [self.local[4]])
+
+        assert_equal(sorted(self.local[1:3]), self.derived(self.up[0]))
+        assert_equal(sorted([self.local[0], self.local[1]]), self.derived(self.up[1]))
@@ -0,0 +1,110 @@
+import os
+from nose.tools import *
+from git.commit import Commit
+from git_origin.cmd import file_origins, left_right
+from test.helper import ScratchRepo
+
+
+def reference_file_origins(repo, fn, upstream, local):
+    """file_origins as it was with Commit.find_all, walking the trees of
+    every commit (but for the "--" before the path)."""
+    def blob(commit):
+        obj = commit.tree
+        for piece in fn.split("/"):
+            obj = obj[piece]
+        return obj
+
+    upstream, local = repo.rev_parse_many([upstream, local])
+    lstart = Commit.iter_find_all(repo, local, fn, reverse=True).next()
+    initialblob = blob(lstart)
+
+    ustart = None
+    for commit in Commit.iter_find_all(repo, upstream, fn):
+        try:
+            if blob(commit).id == initialblob.id:
+                ustart = commit
+                break
+        except KeyError:
+            break
+
+    precommits = set()
+    if ustart:
+        precommits = set(c.id for c in Commit.iter_find_all(repo, ustart.id, fn))
+    return [(c.id in precommits and "-" or c.direction, c.id)
+            for c in reversed(left_right(repo, upstream, local, "--", fn))]
+
+
+class TestFileOrigins(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        os.mkdir(os.path.join(s.path, "dir"))
+        s.commit("dir/file", "one")
+        s.commit("other")
+        s.branch("upstream")
+        s.commit("dir/file", "two")
+        s.commit("other", "up")
+        s.branch("local", "master")
+        s.commit("dir/file", "local")
+
+    def teardown(self):
+        self.scratch.cleanup()
+
+    def check(self, fn, upstream="upstream", local="local"):
+        repo = self.scratch.repo()
+        expected = reference_file_origins(repo, fn, upstream, local)
+        assert_equal(expected, file_origins(repo, fn, upstream, local))
+        return expected
+
+    def test_history(self):
+        s = self.scratch
+        s.git("checkout", "-q", "upstream")
+        imported = [s.commit("dir/imported", "one"), s.commit("dir/imported", "two")]
+        s.branch("side", "upstream~1")
+        s.commit("side")
+        s.git("checkout", "-q", "upstream")
+        s.git("merge", "-q", "--no-edit", "side")
+        later = s.commit("dir/imported", "three")
+
+        # Imported from upstream as of its second commit
+        s.git("checkout", "-q", "local")
+        local = [s.commit("dir/imported", "one\ntwo"), s.commit("dir/imported", "four")]
+        commits = self.check("dir/imported")
+        directions = dict((id, direction) for (direction, id) in commits)
+        assert_equal(["-", "-", "<", ">", ">"],
+                     [directions[id] for id in imported + [later] + local])
+        self.check("dir/file")
+
+    def test_initial_blob_only_before_a_deletion_upstream(self):
+        s = self.scratch
+        s.git("checkout", "-q", "upstream")
+        added = s.commit("dir/added", "one")
+        s.git("rm", "-q", "dir/added")
+        s.git("commit", "-q", "-m", "delete")
+        s.commit("dir/added", "readded")
+        s.git("checkout", "-q", "local")
+        s.commit("dir/added", "one")
+
+        commits = self.check("dir/added")
+        assert_true(("<", added) in commits)
+
+    def test_renames(self):
+        s = self.scratch
+        s.git("checkout", "-q", "upstream")
+        s.git("mv", "dir/file", "dir/renamed")
+        s.git("commit", "-q", "-m", "rename")
+        self.check("dir/file")
+        s.git("checkout", "-q", "local")
+        s.git("mv", "dir/file", "dir/renamed")
+        s.git("commit", "-q", "-m", "rename")
+        self.check("dir/renamed")
+
+    def test_missing_upstream(self):
+        s = self.scratch
+        s.git("checkout", "-q", "local")
+        s.commit("new", "local only")
+        commits = self.check("new")
+        assert_equal([">"], [d for (d, id) in commits])
+
+    def test_missing_locally(self):
+        assert_equal(None, file_origins(self.scratch.repo(), "bogus", "upstream", "local"))
@@ -0,0 +1,48 @@
+from nose.tools import *
+from git_origin.cmd import cherry_matrix, cached_classify, update_blacklist
+from test.helper import ScratchRepo
+
+
+class TestCherryMatrix(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        s.commit("shared")
+        s.branch("a")
+        a = [s.commit("a%d" % i) for i in range(4)]
+        s.branch("b", "master")
+        b = [s.commit("b%d" % i) for i in range(3)]
+        s.branch("c", "a~2")
+        c = [s.commit("c%d" % i) for i in range(4)]
+
+        s.note(b[0], a[0])
+        s.note(c[0], b[0])
+        s.note(c[1], b[1][:10], a[3])
+        s.note(c[2], "0123456789" * 4)
+        s.note(a[2], c[3])
+        update_blacklist(s.repo(), [b[2]])
+        self.refs = ["a", "b", "c"]
+
+    def teardown(self):
+        self.scratch.cleanup()
+
+    def test_pairs_match_cached_classify(self):
+        s = self.scratch
+        matrix = cherry_matrix(s.repo(cold=True), self.refs)
+        assert_equal(6, len(matrix))
+
+        for left in self.refs:
+            for right in self.refs:
+                if left == right:
+                    continue
+                # The commits of left which aren't in right, as listed by
+                # git-cherry-origins right left
+                directions = dict((id, d) for (d, id) in
+                                  cached_classify(s.repo(), right, left, "--reverse"))
+                commits = s.git("rev-list", "--reverse", "%s..%s" % (right, left)).split()
+                plus = [id for id in commits if directions[id] == ">"]
+                minus = [id for id in commits if directions[id] == "-"]
+
+                unported = matrix[(left, right)]
+                assert_equal(plus, unported)
+                assert_equal(len(minus), len(commits) - len(unported))
@@ -0,0 +1,119 @@
+import os
+from nose.tools import *
+from git_origin import notestree
+from git_origin.cmd import Origins, OriginsIndex, update_blacklist, notes_ref
+from test.helper import ScratchRepo
+
+
+class TestWriteNotesTree(object):
+    def setup(self):
+        self.threshold = notestree.fanout_threshold
+        notestree.fanout_threshold = 4
+        self.scratch = ScratchRepo()
+        self.commits = [self.scratch.commit("file%d" % i) for i in range(8)]
+
+    def teardown(self):
+        notestree.fanout_threshold = self.threshold
+        self.scratch.cleanup()
+
+    def write_notes(self, paths):
+        """Commit a notes tree holding the given paths to the notes ref."""
+        s = self.scratch
+        index = os.path.join(s.path, ".git", "test-notes-index")
+        s.env["GIT_INDEX_FILE"] = index
+        try:
+            for (path, data) in sorted(paths.iteritems()):
+                sha = s.git("hash-object", "-w", "--stdin", input=data)
+                s.git("update-index", "--add", "--cacheinfo", "100644", sha, path)
+            tree = s.git("write-tree")
+        finally:
+            del s.env["GIT_INDEX_FILE"]
+            os.unlink(index)
+        s.git("update-ref", notes_ref, s.git("commit-tree", tree, input="notes"))
+        self.origins = Origins(s.repo())
+
+    def paths(self):
+        return self.scratch.git("ls-tree", "-r", "--name-only", notes_ref).split()
+
+    def check(self, origins, blacklist=()):
+        """Check the notes ref, and its index as updated, cached and read
+        from scratch, against the given origins and blacklist."""
+        s = self.scratch
+        listed = [line.split()[1] for line in
+                  s.git("notes", "--ref=origins", "list").splitlines()]
+        assert_equal(sorted(origins), sorted(listed))
+        for (commit, ids) in origins.iteritems():
+            assert_equal("\n".join(ids), s.git("notes", "--ref=origins", "show", commit))
+
+        for index in (self.origins.notes, OriginsIndex.load(s.repo()),
+                      OriginsIndex.load(s.repo(cold=True))):
+            assert_equal(origins, dict(index.origins.iteritems()))
+            assert_equal(sorted(blacklist), sorted(index.blacklist))
+
+    def batch(self):
+        self.origins = Origins(self.scratch.repo())
+        return self.origins.batch()
+
+    def test_migrates_to_fanout_at_threshold(self):
+        c = self.commits
+        origins = {}
+        for (commits, fanout) in ((c[:3], False), (c[3:4], False), (c[4:5], True)):
+            with self.batch() as batch:
+                for commit in commits:
+                    batch[commit] = origins[commit] = [c[7]]
+            self.check(origins)
+            paths = self.paths()
+            assert_equal(len(origins), len(paths))
+            assert_equal(len(paths) * [fanout], ["/" in path for path in paths])
+
+    def test_mixed_flat_and_fanout_notes(self):
+        c = self.commits
+        self.write_notes({
+            c[0]: c[7] + "\n",
+            c[1]: c[7] + "\n",
+            "%s/%s" % (c[2][:2], c[2][2:]): c[7] + "\n",
+            "%s/%s" % (c[3][:2], c[3][2:]): c[7] + "\n",
+        })
+        self.check({c[0]: [c[7]], c[1]: [c[7]], c[2]: [c[7]], c[3]: [c[7]]})
+
+        with self.batch() as batch:
+            del batch[c[0]]
+            del batch[c[2]]
+            batch[c[1]] = [c[6]]
+            batch[c[4]] = [c[6]]
+        self.check({c[1]: [c[6]], c[3]: [c[7]], c[4]: [c[6]]})
+        # The tree is fanned out already, so the changed notes move
+        assert_equal(sorted("%s/%s" % (id[:2], id[2:]) for id in (c[1], c[3], c[4])),
+                     self.paths())
+
+    def test_nested_fanout_notes(self):
+        c = self.commits
+        self.write_notes(dict(("%s/%s/%s" % (id[:2], id[2:4], id[4:]), c[7] + "\n")
+                              for id in c[:3]))
+        self.check({c[0]: [c[7]], c[1]: [c[7]], c[2]: [c[7]]})
+
+        with self.batch() as batch:
+            del batch[c[0]]
+            batch[c[1]] = [c[6]]
+        self.check({c[1]: [c[6]], c[2]: [c[7]]})
+        assert_equal(sorted(["%s/%s" % (c[1][:2], c[1][2:]),
+                             "%s/%s/%s" % (c[2][:2], c[2][2:4], c[2][4:])]),
+                     self.paths())
+
+    def test_blacklist_shards(self):
+        c = self.commits
+        self.write_notes({"blacklist": c[0] + "\n", c[1]: c[7] + "\n"})
+        self.check({c[1]: [c[7]]}, [c[0]])
+
+        update_blacklist(self.origins.repo, c[2:4])
+        self.check({c[1]: [c[7]]}, c[:1] + c[2:4])
+        # The single blacklist blob is migrated to shards
+        assert_equal(sorted(set("blacklist/" + id[:2] for id in c[:1] + c[2:4]) | set([c[1]])),
+                     self.paths())
+        for id in c[:1] + c[2:4]:
+            assert id in self.scratch.git("show", "%s:blacklist/%s" % (notes_ref, id[:2])).split()
+
+        self.origins = Origins(self.scratch.repo())
+        update_blacklist(self.origins.repo, c[:1] + c[2:3], remove=True)
+        self.check({c[1]: [c[7]]}, c[3:4])
+        assert_equal(sorted(["blacklist/" + c[3][:2], c[1]]), self.paths())
@@ -0,0 +1,133 @@
+import os
+from nose.tools import *
+from git_origin import patchid
+from git_origin.cmd import populate_origins, populate_trailers, update_blacklist, \
+     OriginsIndex, trailer_scan_filename
+from git_origin.patchid import PatchIdCache
+from test.helper import ScratchRepo
+
+
+class TestPopulateOrigins(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        s.branch("upstream")
+        s.commit("up1")
+        self.up = s.commit("shared", "the change")
+        s.commit("up2")
+        s.branch("local", "master")
+        self.picked = s.commit("shared", "the change")
+        self.local = s.commit("local1")
+
+        # Count the commits diffed for their patch-ids
+        self.diffed = []
+        self.compute_patch_ids = patchid.compute_patch_ids
+        def compute_patch_ids(repo, commits):
+            self.diffed.extend(commits)
+            return self.compute_patch_ids(repo, commits)
+        patchid.compute_patch_ids = compute_patch_ids
+
+    def teardown(self):
+        patchid.compute_patch_ids = self.compute_patch_ids
+        self.scratch.cleanup()
+
+    def populate(self):
+        repo = self.scratch.repo()
+        return (populate_origins(repo, "upstream", "local"), OriginsIndex.load(repo).origins)
+
+    def test_matches_cherry_picks_by_patch_id(self):
+        (count, origins) = self.populate()
+        assert_equal(1, count)
+        assert_equal({self.picked: [self.up]}, dict(origins.iteritems()))
+        assert_equal(5, len(self.diffed))
+
+        del self.diffed[:]
+        (count, origins) = self.populate()
+        assert_equal(0, count)
+        assert_equal({self.picked: [self.up]}, dict(origins.iteritems()))
+        assert_equal([], self.diffed)
+
+    def test_skips_blacklisted_commits(self):
+        update_blacklist(self.scratch.repo(), [self.picked])
+        (count, origins) = self.populate()
+        assert_equal(0, count)
+        assert_equal({}, dict(origins.iteritems()))
+
+
+class TestPatchIdCache(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        self.commits = [s.commit("file%d" % i) for i in range(3)]
+        s.git("commit", "-q", "--allow-empty", "-m", "empty")
+        self.empty = s.git("rev-parse", "HEAD")
+        self.path = os.path.join(s.path, ".git", patchid.cache_filename)
+
+    def teardown(self):
+        self.scratch.cleanup()
+
+    def patch_ids(self, commits):
+        return PatchIdCache(self.scratch.repo()).patch_ids(commits)
+
+    def test_commits_without_patch_id_are_recorded(self):
+        pids = self.patch_ids(self.commits + [self.empty])
+        assert_equal(sorted(self.commits), sorted(pids))
+        assert_equal(4 * patchid._record_size, os.path.getsize(self.path))
+
+        cache = PatchIdCache(self.scratch.repo())
+        assert_equal(patchid._no_patch_id, cache.ids[self.empty])
+        assert_equal(pids, cache.patch_ids(self.commits + [self.empty]))
+        assert_equal(4 * patchid._record_size, os.path.getsize(self.path))
+
+    def test_partial_records_are_ignored(self):
+        pids = self.patch_ids(self.commits[:2])
+        open(self.path, "ab").write("\1" * (patchid._record_size / 2))
+
+        cache = PatchIdCache(self.scratch.repo())
+        assert_equal(pids, cache.ids)
+        assert_equal(pids, cache.patch_ids(self.commits[:2]))
+
+        # The next append drops the partial record
+        pids.update(cache.patch_ids(self.commits))
+        assert_equal(3 * patchid._record_size, os.path.getsize(self.path))
+        assert_equal(pids, PatchIdCache(self.scratch.repo()).ids)
+
+
+class TestPopulateTrailers(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        self.other = ScratchRepo()
+        self.origin = self.other.commit("elsewhere")
+
+        s = self.scratch
+        s.branch("upstream")
+        s.commit("up1")
+        s.branch("local", "master")
+        self.full = s.commit("l1", message="l1\n\n(cherry picked from commit %s)" % self.origin)
+        self.short = s.commit("l2", message="l2\n\n(cherry picked from commit %s)" % self.origin[:10])
+        self.scan = os.path.join(s.path, ".git", trailer_scan_filename)
+
+    def teardown(self):
+        self.scratch.cleanup()
+        self.other.cleanup()
+
+    def populate(self):
+        repo = self.scratch.repo()
+        count = populate_trailers(repo, *repo.rev_parse_many(["upstream", "local"]))
+        return (count, OriginsIndex.load(repo).origins)
+
+    def test_records_unfetched_full_ids(self):
+        (count, origins) = self.populate()
+        assert_equal(1, count)
+        assert_equal([self.origin], origins.get(self.full))
+        assert_equal(None, origins.get(self.short))
+
+    def test_rescans_until_abbreviated_ids_resolve(self):
+        self.populate()
+        assert_false(os.path.exists(self.scan))
+
+        self.scratch.git("fetch", "-q", self.other.path, "master:refs/heads/other")
+        (count, origins) = self.populate()
+        assert_equal(1, count)
+        assert_equal([self.origin], origins.get(self.short))
+        assert_equal(self.scratch.git("rev-parse", "local"), open(self.scan).read().strip())
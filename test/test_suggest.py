@@ -0,0 +1,28 @@
+from nose.tools import *
+from git_origin.cmd import suggest_origins
+from test.helper import ScratchRepo
+
+lines = "".join("line %d\n" % i for i in range(20))
+
+
+class TestSuggest(object):
+    def setup(self):
+        self.scratch = ScratchRepo()
+        s = self.scratch
+        s.branch("upstream")
+        self.upstream = s.commit("change", lines)
+        s.branch("local", "master")
+        self.picked = s.commit("change", lines + "local tweak\n")
+
+    def teardown(self):
+        self.scratch.cleanup()
+
+    def test_suggests_for_commits_without_notes(self):
+        candidates = suggest_origins(self.scratch.repo(), "upstream", "local")
+        assert_equal([(self.picked, self.upstream)], [c[1:] for c in candidates])
+
+    def test_skips_commits_with_notes(self):
+        # Even if the origins of the note are outside of the range
+        s = self.scratch
+        s.note(self.picked, "0123456789" * 4)
+        assert_equal([], suggest_origins(s.repo(), "upstream", "local"))